@@ -26,10 +26,29 @@ from utils import (
     find_valid_sequences,
     flatten_sequences,
     get_reflectivity_data,
+    encode_sparse_frame,
+    frame_pyramid,
+    block_mean_pool,
 )
 
 
 MANILA_TZ = timezone(timedelta(hours=8))
+OBJECTS_PREFIX = "objects"
+RUNS_PREFIX = "runs"
+# Older runs (manifest and objects) stay readable this long after a new
+# publish, covering readers still on a cached run pointer (chatbot: 60 s
+# TTL + 10 min stale-while-revalidate) with room for a slow publish
+RUN_RETENTION = timedelta(minutes=30)
+LEAD_STEP_MINUTES = 5
+TIMELINE_SUMMARY_FILENAME = "timeline_summary.jsonl"
+# Lower bound of each _rain_category band above "Very light"; the top band is
+# exclusive (> 65) like _rain_category, the others inclusive
+RAIN_THRESHOLDS: Tuple[Tuple[str, float, bool], ...] = (
+    ("Light", 20.0, True),
+    ("Moderate", 40.0, True),
+    ("Heavy", 50.0, True),
+    ("Extremely heavy", 65.0, False),
+)
 
 
 # ----------------------------
@@ -66,6 +85,110 @@ def clear_bucket(supabase_client: Client, bucket_name: str):
     else:
         print("No files found in Supabase bucket.")
 
+def remove_legacy_frames(supabase_client: Client, bucket_name: str):
+    """Delete RAW_*.json frames from the bucket root left by older publishers."""
+    storage = supabase_client.storage.from_(bucket_name)
+    try:
+        names = [f["name"] for f in storage.list() or [] if f.get("name", "").startswith("RAW_")]
+    except Exception as exc:
+        print(f"⚠️ Unable to list legacy frames: {exc}")
+        return
+    if names:
+        storage.remove(names)
+        print(f"🗑️ Removed {len(names)} legacy root frame(s).")
+
+def _object_path(digest: str, extension: str) -> str:
+    """
+    Content-addressed location for an artifact: objects/<aa>/<sha256><ext>.
+    """
+    return f"{OBJECTS_PREFIX}/{digest[:2]}/{digest}{extension}"
+
+
+def _object_exists(storage, path: str) -> bool:
+    folder, name = path.rsplit("/", 1)
+    try:
+        items = storage.list(folder, {"search": name})
+    except Exception:
+        return False
+    return any(item.get("name") == name for item in items or [])
+
+
+def put_object(storage, data: bytes, extension: str, content_type: str) -> Dict[str, object]:
+    """
+    Store bytes under their sha256 and skip the upload when the object is
+    already in the bucket. Returns the reference written into manifests.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    path = _object_path(digest, extension)
+    ref = {"sha256": digest, "path": path, "size": len(data)}
+    if _object_exists(storage, path):
+        print(f"  ⏭️ Unchanged, skipped upload of {path}")
+        return ref
+
+    res = storage.upload(
+        path,
+        data,
+        file_options={
+            "content-type": content_type,
+            "upsert": "true",
+        },
+    )
+    if hasattr(res, "error") and res.error:
+        raise RuntimeError(f"Upload failed for {path}: {res.error}")
+    print(f"  ✅ Uploaded {path} ({len(data)} bytes)")
+    return ref
+
+
+def _manifest_object_paths(manifest: Dict[str, object]) -> List[str]:
+    """Every content-addressed object a run manifest references."""
+    paths = [entry.get("object_path") for entry in (manifest.get("files") or {}).values()]
+    paths.append((manifest.get("locations_object") or {}).get("path"))
+    paths.append((manifest.get("timeline_summary") or {}).get("object_path"))
+    radar_frames = manifest.get("radar_frames") or {}
+    paths.append(radar_frames.get("coordinates_file"))
+    paths.extend(frame.get("object_path") for frame in radar_frames.get("frames") or [])
+    return [path for path in paths if path]
+
+
+def _run_time(run_name: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(run_name, "%Y%m%dT%H%MPHT").replace(tzinfo=MANILA_TZ)
+    except ValueError:
+        return None
+
+
+def collect_unreferenced_objects(supabase_client: Client, bucket_name: str, keep_paths):
+    """
+    Remove content-addressed objects that no retained run references.
+    keep_paths should cover the current run and every run still inside
+    RUN_RETENTION (see pred_to_chatbot_data's return value).
+    """
+    storage = supabase_client.storage.from_(bucket_name)
+    keep = set(keep_paths)
+    try:
+        shards = storage.list(OBJECTS_PREFIX)
+    except Exception as exc:
+        print(f"⚠️ Unable to list objects for cleanup: {exc}")
+        return
+
+    stale: List[str] = []
+    for shard in shards or []:
+        shard_name = (shard.get("name") or "").rstrip("/")
+        if not shard_name:
+            continue
+        try:
+            items = storage.list(f"{OBJECTS_PREFIX}/{shard_name}")
+        except Exception:
+            items = []
+        for item in items or []:
+            path = f"{OBJECTS_PREFIX}/{shard_name}/{item.get('name')}"
+            if item.get("name") and path not in keep:
+                stale.append(path)
+
+    if stale:
+        storage.remove(stale)
+        print(f"🗑️ Removed {len(stale)} unreferenced object(s).")
+
 def predict(model, input_data):
     """
     Predict reflectivity data for the next 120 mins of reflectivity data.
@@ -128,19 +251,46 @@ def pred_to_json(
     base_time: datetime,
 ):
     """
-    Convert predictions to JSON format suitable for raw storage.
-    Filenames follow RAW_YYYYMMDD_HHMMSS based on base_time + lead minutes.
+    Convert predictions to dashboard frames stored as content-addressed
+    objects. The lat/lon grid is stored once and referenced by each frame;
+    each frame stores its reflectivity with encode_sparse_frame plus
+    block-pooled coarse levels (see frame_pyramid). Run, lead and valid
+    time live in the returned frame list rather than in the frame, so a
+    frame identical to an earlier run's (e.g. no rain) is not uploaded
+    again. The list is published in the run manifest as "radar_frames".
     """
     # load metadata
     
     print(metadata.keys())
     predicted_refl = np.array(predictions)
     T = predicted_refl.shape[0]
+    run_id = base_time.strftime("%Y%m%dT%H%MPHT")
+
+    lat_levels = frame_pyramid(metadata["coordinates"]["lat"], pool=block_mean_pool)
+    lon_levels = frame_pyramid(metadata["coordinates"]["lon"], pool=block_mean_pool)
+    coordinates_bytes = json.dumps(
+        {
+            "lat": metadata["coordinates"]["lat"],
+            "lon": metadata["coordinates"]["lon"],
+            "pyramid": {
+                str(size): {"lat": lat_levels[size].tolist(), "lon": lon_levels[size].tolist()}
+                for size in lat_levels
+                if size != len(metadata["coordinates"]["lat"])
+            },
+        }
+    ).encode('utf-8')
+    coordinates_ref = put_object(
+        supabase_client.storage.from_(BUCKET_NAME),
+        coordinates_bytes,
+        ".json",
+        "application/json",
+    )
 
+    storage = supabase_client.storage.from_(BUCKET_NAME)
+    frames: List[Dict[str, object]] = []
     for t in range(T):
-        lead_minutes = 5 * (t + 1)
+        lead_minutes = LEAD_STEP_MINUTES * (t + 1)
         timestep_dt = base_time + timedelta(minutes=lead_minutes)
-        ts_str = timestep_dt.strftime("%Y%m%d_%H%M%S")
         lead_label = f"+{lead_minutes}min"
         prediction_dict = {
             "metadata": {
@@ -150,30 +300,31 @@ def pred_to_json(
                 "origin_longitude": metadata["metadata"]["origin_longitude"],
                 "projection": metadata["metadata"]["projection"],
                 "shape": predicted_refl[t].shape,
-                "lead_time": lead_label,
-                "valid_datetime": timestep_dt.isoformat()
             },
-            "coordinates": {
-                "lat": metadata["coordinates"]["lat"],
-                "lon": metadata["coordinates"]["lon"]
+            "coordinates_file": coordinates_ref["path"],
+            "reflectivity": encode_sparse_frame(predicted_refl[t]),
+            "pyramid": {
+                str(size): encode_sparse_frame(level)
+                for size, level in frame_pyramid(predicted_refl[t]).items()
+                if size != predicted_refl[t].shape[0]
             },
-            "reflectivity": predicted_refl[t].tolist()
         }
 
         # Convert JSON dict to bytes
-        json_bytes = json.dumps(prediction_dict).encode('utf-8')
-
-        # Upload bytes directly to Supabase
-        res = supabase_client.storage.from_(BUCKET_NAME).upload(
-            f'RAW_{ts_str}.json',
-            json_bytes,
-            file_options={"content-type": "application/json"}
+        json_bytes = json.dumps(prediction_dict, separators=(",", ":")).encode('utf-8')
+        ref = put_object(storage, json_bytes, ".json", "application/json")
+        frames.append(
+            {
+                "lead_minutes": lead_minutes,
+                "lead_time": lead_label,
+                "valid_datetime": timestep_dt.isoformat(),
+                "object_path": ref["path"],
+                "sha256": ref["sha256"],
+                "size": ref["size"],
+            }
         )
 
-        if hasattr(res, 'error') and res.error:
-            print(f"❌ Upload failed for RAW_{ts_str}.json: {res.error}")
-        else:
-            print(f"✅ Uploaded to Supabase: RAW_{ts_str}.json")
+    return {"run_id": run_id, "coordinates_file": coordinates_ref["path"], "frames": frames}
 
 def _rain_category(dbz: float) -> str:
     """
@@ -240,13 +391,13 @@ def _safe_reflectivity(value) -> Optional[float]:
 def _build_records_for_slice(
     slice_data: np.ndarray,
     *,
-    lead_minutes: int,
-    valid_dt: datetime,
-    run_id: str,
     locations: List[Dict[str, object]],
 ) -> List[Dict[str, object]]:
     """
     Flatten one prediction slice into per-location records.
+    Run, lead and valid time live in the manifest entry for the file, so
+    records only change when the forecast at a location changes and
+    identical slices hash to the same object across runs.
     """
     flat = np.asarray(slice_data).reshape(-1)
     expected = len(locations)
@@ -261,14 +412,11 @@ def _build_records_for_slice(
         refl = _safe_reflectivity(refl_val)
         records.append(
             {
-                "run_id": run_id,
                 "place": loc["place"],
                 "normalized_place": loc["normalized_place"],
                 "location_index": loc["index"],
                 "latitude": loc["latitude"],
                 "longitude": loc["longitude"],
-                "lead_minutes": lead_minutes,
-                "valid_datetime": valid_dt.isoformat(),
                 "reflectivity": refl,
                 "rain_category": _rain_category(refl),
             }
@@ -276,6 +424,80 @@ def _build_records_for_slice(
     return records
 
 
+def _slice_matrix(slices: List[np.ndarray], location_count: int) -> np.ndarray:
+    """
+    Stack per-lead slices into a (leads, locations) float matrix aligned with
+    the location list. Short slices are padded with NaN instead of truncated
+    so every location keeps its column.
+    """
+    matrix = np.full((len(slices), location_count), np.nan, dtype=np.float64)
+    for row, slice_data in enumerate(slices):
+        flat = np.asarray(slice_data, dtype=np.float64).reshape(-1)[:location_count]
+        matrix[row, : flat.size] = flat
+    matrix[~np.isfinite(matrix)] = np.nan
+    return matrix
+
+
+def _lead_or_none(values: np.ndarray, present: np.ndarray) -> List[Optional[int]]:
+    return [int(value) if ok else None for value, ok in zip(values.tolist(), present.tolist())]
+
+
+def _build_timeline_summary(
+    matrix: np.ndarray,
+    lead_minutes_values: List[int],
+    locations: List[Dict[str, object]],
+) -> List[Dict[str, object]]:
+    """
+    Per-location onset/peak records computed over the whole (leads, locations)
+    matrix at once: for every RAIN_THRESHOLDS band, the first and last lead at
+    or above it and the minutes spent there, plus the peak dBZ and its lead.
+    Leads are minutes after base_time; lead 0 is the latest observation.
+    """
+    leads = np.asarray(lead_minutes_values, dtype=np.int64)
+    finite = np.isfinite(matrix)
+    has_data = finite.any(axis=0)
+    filled = np.where(finite, matrix, -np.inf)
+
+    peak_row = filled.argmax(axis=0)
+    peak_value = filled[peak_row, np.arange(matrix.shape[1])]
+    peak_lead = leads[peak_row]
+
+    bands: Dict[str, Dict[str, List[Optional[int]]]] = {}
+    for name, threshold, inclusive in RAIN_THRESHOLDS:
+        above = filled >= threshold if inclusive else filled > threshold
+        reached = above.any(axis=0)
+        first_row = above.argmax(axis=0)
+        last_row = above.shape[0] - 1 - above[::-1].argmax(axis=0)
+        bands[name] = {
+            "onset": _lead_or_none(leads[first_row], reached),
+            "until": _lead_or_none(leads[last_row], reached),
+            "minutes": (above.sum(axis=0) * LEAD_STEP_MINUTES).tolist(),
+        }
+
+    records: List[Dict[str, object]] = []
+    for col, loc in enumerate(locations):
+        peak = _safe_reflectivity(peak_value[col]) if has_data[col] else None
+        records.append(
+            {
+                "place": loc["place"],
+                "normalized_place": loc["normalized_place"],
+                "location_index": loc["index"],
+                "peak_reflectivity": peak,
+                "peak_lead_minutes": int(peak_lead[col]) if peak is not None else None,
+                "peak_category": _rain_category(peak),
+                "thresholds": {
+                    name: {
+                        "onset_lead_minutes": band["onset"][col],
+                        "until_lead_minutes": band["until"][col],
+                        "minutes_above": int(band["minutes"][col]),
+                    }
+                    for name, band in bands.items()
+                },
+            }
+        )
+    return records
+
+
 def _encode_records_to_jsonl(records: List[Dict[str, object]]) -> Tuple[bytes, List[Tuple[int, int]]]:
     """
     Encode records into UTF-8 JSON Lines and capture byte offsets per record.
@@ -323,10 +545,17 @@ def pred_to_chatbot_data(
     supabase_client,
     BUCKET_NAME,
     base_time: datetime,
+    radar_frames: Optional[Dict[str, object]] = None,
 ):
     """
     Convert predictions to per-location chatbot JSON files.
     Filenames follow valid_<YYYYMMDDTHHMMPHT>.jsonl using Manila local time slots.
+    Lead files and the location list are stored as content-addressed objects;
+    the run manifest maps each filename to its object path and also lists the
+    dashboard frames from pred_to_json. Manifests of runs older than
+    RUN_RETENTION are removed once latest.txt points at the new run. Returns
+    the object paths referenced by the new manifest and the retained ones,
+    or None when the retained runs could not all be read.
     """
     locations = locations_path.get("locations", [])
 
@@ -351,7 +580,9 @@ def pred_to_chatbot_data(
     base_time_utc = base_time_local.astimezone(timezone.utc)
     run_id = base_time_local.strftime("%Y%m%dT%H%MPHT")
 
-    lead_minutes_values: List[int] = [0] + [5 * (idx + 1) for idx in range(predicted_refl.shape[0])]
+    lead_minutes_values: List[int] = [0] + [
+        LEAD_STEP_MINUTES * (idx + 1) for idx in range(predicted_refl.shape[0])
+    ]
     slices = [latest_obs_arr] + [predicted_refl[idx] for idx in range(predicted_refl.shape[0])]
 
     lead_files: List[Dict[str, object]] = []
@@ -363,9 +594,6 @@ def pred_to_chatbot_data(
         valid_dt_utc = valid_dt_local.astimezone(timezone.utc)
         records = _build_records_for_slice(
             slice_data,
-            lead_minutes=lead_minutes,
-            valid_dt=valid_dt_utc,
-            run_id=run_id,
             locations=prepared_locations,
         )
         file_bytes, offsets = _encode_records_to_jsonl(records)
@@ -374,6 +602,7 @@ def pred_to_chatbot_data(
         filename = f"valid_{ts_tag_local}.jsonl"
         file_hash = hashlib.sha256(file_bytes).hexdigest()
         file_size = len(file_bytes)
+        object_path = _object_path(file_hash, ".jsonl")
 
         lead_files.append(
             {
@@ -387,6 +616,7 @@ def pred_to_chatbot_data(
         )
         manifest_files[filename] = {
             "sha256": file_hash,
+            "object_path": object_path,
             "size": file_size,
             "entry_count": len(offsets),
             "hash_lookup": compressed_lookup,
@@ -405,6 +635,31 @@ def pred_to_chatbot_data(
             }
         )
 
+    # One record per location answers "when does it start / how bad does it
+    # get" without reading every lead file
+    summary_records = _build_timeline_summary(
+        _slice_matrix(slices, len(prepared_locations)),
+        lead_minutes_values,
+        prepared_locations,
+    )
+    summary_bytes, summary_offsets = _encode_records_to_jsonl(summary_records)
+    summary_hash = hashlib.sha256(summary_bytes).hexdigest()
+
+    manifest_locations = [
+        {
+            "place": loc["place"],
+            "normalized_place": loc["normalized_place"],
+            "latitude": loc["latitude"],
+            "longitude": loc["longitude"],
+            "location_index": loc["index"],
+        }
+        for loc in prepared_locations
+    ]
+    locations_bytes = json.dumps(
+        manifest_locations, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+    locations_hash = hashlib.sha256(locations_bytes).hexdigest()
+
     manifest = {
         "run_id": run_id,
         "base_time": base_time_local.isoformat(),
@@ -413,63 +668,37 @@ def pred_to_chatbot_data(
         "lead_bins": lead_minutes_values,
         "files": manifest_files,
         "time_slots": time_slots,
-        "locations": [
-            {
-                "place": loc["place"],
-                "normalized_place": loc["normalized_place"],
-                "latitude": loc["latitude"],
-                "longitude": loc["longitude"],
-                "location_index": loc["index"],
-            }
-            for loc in prepared_locations
-        ],
+        "locations_object": {
+            "sha256": locations_hash,
+            "path": _object_path(locations_hash, ".json"),
+            "size": len(locations_bytes),
+            "entry_count": len(manifest_locations),
+        },
+        "timeline_summary": {
+            "filename": TIMELINE_SUMMARY_FILENAME,
+            "sha256": summary_hash,
+            "object_path": _object_path(summary_hash, ".jsonl"),
+            "size": len(summary_bytes),
+            "entry_count": len(summary_offsets),
+            "hash_lookup": _compress_offsets(summary_offsets),
+            "step_minutes": LEAD_STEP_MINUTES,
+            "thresholds": {name: threshold for name, threshold, _ in RAIN_THRESHOLDS},
+        },
     }
+    if radar_frames:
+        manifest["radar_frames"] = radar_frames
 
     manifest_bytes = json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
     manifest_path = f"runs/{run_id}/manifest.json"
 
     storage = supabase_client.storage.from_(BUCKET_NAME)
-    try:
-        existing_runs = storage.list("runs")
-    except Exception as exc:
-        existing_runs = []
-        print(f"⚠️ Unable to list existing run folders: {exc}")
-
-    stale_runs = [entry.get("name") for entry in existing_runs or [] if entry.get("name")]
-    removed_total = 0
-    for run_name in stale_runs:
-        normalized = run_name.rstrip("/")
-        try:
-            run_items = storage.list(f"runs/{normalized}")
-        except Exception:
-            run_items = []
-        paths = [
-            f"runs/{normalized}/{item.get('name')}"
-            for item in (run_items or [])
-            if item.get("name")
-        ]
-        if paths:
-            storage.remove(paths)
-            removed_total += len(paths)
-    if removed_total:
-        print(f"🗑️ Removed {removed_total} previous run object(s).")
-
-    run_prefix = f"runs/{run_id}/"
 
     print(f"📦 Publishing chatbot run {run_id} with {len(lead_files)} lead files…")
+    referenced_paths: List[str] = _manifest_object_paths(manifest)
     for lead_file in lead_files:
-        path = f"{run_prefix}{lead_file['name']}"
-        res = storage.upload(
-            path,
-            lead_file["bytes"],
-            file_options={
-                "content-type": "application/x-ndjson",
-                "upsert": "true",
-            },
-        )
-        if hasattr(res, "error") and res.error:
-            raise RuntimeError(f"Upload failed for {path}: {res.error}")
-        print(f"  ✅ Uploaded {path} ({lead_file['size']} bytes)")
+        put_object(storage, lead_file["bytes"], ".jsonl", "application/x-ndjson")
+    put_object(storage, locations_bytes, ".json", "application/json")
+    put_object(storage, summary_bytes, ".jsonl", "application/x-ndjson")
 
     res_manifest = storage.upload(
         manifest_path,
@@ -496,6 +725,59 @@ def pred_to_chatbot_data(
         raise RuntimeError(f"Upload failed for latest.txt: {latest_res.error}")
     print("  ✅ Updated latest.txt")
 
+    retained_paths = _expire_old_runs(storage, run_id, base_time_local - RUN_RETENTION)
+    if retained_paths is None:
+        return None
+    return referenced_paths + retained_paths
+
+
+def _expire_old_runs(storage, current_run_id: str, cutoff: datetime) -> Optional[List[str]]:
+    """
+    Remove run folders published before cutoff and return the object paths
+    referenced by the runs that are kept, so their objects survive cleanup.
+    Returns None when the run folders cannot be listed or a retained run's
+    manifest cannot be read: the kept objects are then unknown, and a run
+    whose manifest failed to load is kept rather than treated as expired.
+    """
+    try:
+        existing_runs = storage.list(RUNS_PREFIX)
+    except Exception as exc:
+        print(f"⚠️ Unable to list existing run folders: {exc}")
+        return None
+
+    retained_paths: List[str] = []
+    complete = True
+    removed_total = 0
+    for entry in existing_runs or []:
+        run_name = (entry.get("name") or "").rstrip("/")
+        if not run_name or run_name == current_run_id:
+            continue
+        run_time = _run_time(run_name)
+        if run_time is not None and run_time >= cutoff:
+            try:
+                old_manifest = json.loads(storage.download(f"{RUNS_PREFIX}/{run_name}/manifest.json"))
+            except Exception as exc:
+                print(f"⚠️ Unable to read manifest of retained run {run_name}: {exc}")
+                complete = False
+            else:
+                retained_paths.extend(_manifest_object_paths(old_manifest))
+            continue
+        try:
+            run_items = storage.list(f"{RUNS_PREFIX}/{run_name}")
+        except Exception:
+            run_items = []
+        paths = [
+            f"{RUNS_PREFIX}/{run_name}/{item.get('name')}"
+            for item in (run_items or [])
+            if item.get("name")
+        ]
+        if paths:
+            storage.remove(paths)
+            removed_total += len(paths)
+    if removed_total:
+        print(f"🗑️ Removed {removed_total} expired run object(s).")
+    return retained_paths if complete else None
+
 
 def get_data_from_supabase(supabase_client, BUCKET_NAME):
     """
@@ -561,8 +843,6 @@ def main():
     supabase_client, bucket_predicted, bucket_nc, bucket_meta  = init_supabase()
     ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
     model_path = ensure_model_exists()
-     # Clear existing files in Supabase buckets
-    clear_bucket(supabase_client, bucket_predicted)
     # Clear existing NetCDF inputs before downloading new radar data
     clear_bucket(supabase_client, bucket_nc)
     # Get radar data, make predictions, and upload results
@@ -570,21 +850,34 @@ def main():
     input_data = get_data_from_supabase(supabase_client, bucket_nc)
     predictions_2hours, base_time, latest_observation = predicted_data(input_data, model_path)
     run_timestamp = datetime.now(MANILA_TZ).replace(second=0, microsecond=0)
-    pred_to_json(
+    radar_frames = pred_to_json(
         predictions_2hours,
         metadata_path,
         supabase_client,
         bucket_predicted,
         run_timestamp,
     )
-    pred_to_chatbot_data(
+    # The predicted bucket is no longer cleared up front: the previous run
+    # stays live until latest.txt moves, then expires after RUN_RETENTION
+    referenced_objects = pred_to_chatbot_data(
         predictions_2hours,
         latest_observation,
         locations_path,
         supabase_client,
         bucket_predicted,
         run_timestamp,
+        radar_frames=radar_frames,
     )
+    remove_legacy_frames(supabase_client, bucket_predicted)
+    if referenced_objects is None:
+        # A retained run's objects are unknown; deleting now could break it
+        print("⚠️ Skipping object cleanup until every retained run can be read.")
+    else:
+        collect_unreferenced_objects(
+            supabase_client,
+            bucket_predicted,
+            referenced_objects,
+        )
     
 
 if __name__ == "__main__":
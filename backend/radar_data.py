@@ -1,10 +1,44 @@
 import os
+import re
 import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
 import numpy as np
-import streamlit as st
+import requests
 from dotenv import load_dotenv
+from scipy.spatial import cKDTree
 from supabase import Client, create_client
 
+from backend.utils import block_mean_pool, decode_sparse_frame, frame_pyramid
+
+LATEST_MARKER_PATH = "latest.txt"
+RUNS_PREFIX = "runs"
+RUN_POINTER_TTL = 60.0  # seconds between checks of the published run pointer
+MAX_CACHED_RUNS = 2     # current run plus the one it replaced
+DOWNLOAD_WORKERS = 8    # concurrent frame downloads per run
+FRAME_NAME_RE = re.compile(r"RAW_(\d{8}_\d{6})")
+WATCH_INTERVAL = 15.0   # seconds between conditional GETs of latest.txt
+EXPECTED_LEADS = [f"+{minutes}min" for minutes in range(5, 125, 5)]
+INCOMPLETE_RETRY = 10.0  # seconds before re-downloading a run that was incomplete
+
+# Process-wide state shared by every Streamlit session
+_RUN_POINTER: Dict[str, Any] = {"value": None, "expires": 0.0}
+_RUN_CACHE: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+_POINT_INDEX: Dict[str, Dict[str, Any]] = {}
+_CACHE_LOCK = threading.Lock()
+_LOAD_LOCK = threading.Lock()
+_CLIENT_LOCK = threading.Lock()
+_COORDINATES_LOCK = threading.Lock()
+_STORAGE: Dict[str, Any] = {"client": None, "bucket": None}
+_WATCHER: Dict[str, Any] = {"thread": None, "etag": None}
+_WATCHER_LOCK = threading.Lock()
+_INCOMPLETE: Dict[str, float] = {}  # run id -> monotonic time of the next attempt
+
 def init_supabase():
     dotenv_path = os.path.join(os.path.dirname(__file__), '../config/.env.example')
     load_dotenv(dotenv_path)
@@ -15,14 +49,355 @@ def init_supabase():
     client = create_client(SUPABASE_URL, SUPABASE_KEY)
     return client, BUCKET_NAME_PREDICTED, BUCKET_NAME_NC
 
-@st.cache_data
-def generate_radar_data():
-    supabase_client, bucket_predicted, bucket_nc = init_supabase()
-    
-    predicted_data = {}
-    files = supabase_client.storage.from_(bucket_predicted).list()
-    for i, f in enumerate(filter(lambda x: x["name"].startswith("RAW"), files)):
-        data_bytes = supabase_client.storage.from_(bucket_predicted).download(f["name"])
-        data = json.loads(data_bytes.decode("utf-8"))
-        predicted_data[f"+{(i+1)*5}min"] = data
+def _storage():
+    """Process-wide storage handle; its HTTP connection pool is reused by all loads."""
+    if _STORAGE["client"] is None:
+        with _CLIENT_LOCK:
+            if _STORAGE["client"] is None:
+                client, bucket_predicted, _ = init_supabase()
+                _STORAGE["bucket"] = bucket_predicted
+                _STORAGE["client"] = client
+    return _STORAGE["client"].storage.from_(_STORAGE["bucket"])
+
+def _readonly(arr):
+    arr = np.asarray(arr)
+    arr.setflags(write=False)
+    return arr
+
+def _coordinate_levels(coords):
+    """Lat/lon grids per pyramid size, from the published pyramid or pooled locally."""
+    lat = _readonly(np.asarray(coords["lat"], dtype=np.float64))
+    lon = _readonly(np.asarray(coords["lon"], dtype=np.float64))
+    published = coords.get("pyramid") or {}
+    if published:
+        levels = {
+            int(size): {
+                "lat": _readonly(np.asarray(level["lat"], dtype=np.float64)),
+                "lon": _readonly(np.asarray(level["lon"], dtype=np.float64)),
+            }
+            for size, level in published.items()
+        }
+    else:
+        lat_levels = frame_pyramid(lat, pool=block_mean_pool)
+        lon_levels = frame_pyramid(lon, pool=block_mean_pool)
+        levels = {
+            size: {"lat": _readonly(lat_levels[size]), "lon": _readonly(lon_levels[size])}
+            for size in lat_levels
+        }
+    levels[lat.shape[0]] = {"lat": lat, "lon": lon}
+    return {"lat": lat, "lon": lon, "levels": levels}
+
+def _load_coordinates(storage, filename, cache):
+    """Download a shared lat/lon grid once per run, even when frames load concurrently."""
+    with _COORDINATES_LOCK:
+        if filename not in cache:
+            coords = json.loads(storage.download(filename).decode("utf-8"))
+            cache[filename] = _coordinate_levels(coords)
+        return cache[filename]
+
+def decode_radar_frame(data, storage, coordinates_cache):
+    """
+    Expand a RAW frame into read-only dense arrays. Frames published with a
+    sparse reflectivity payload and a shared coordinates file are decoded
+    here; legacy frames with inline dense grids are converted as well.
+    data["levels"][size] holds lat/lon/reflectivity for each pyramid size.
+    """
+    if "coordinates" not in data and data.get("coordinates_file"):
+        data["coordinates"] = _load_coordinates(storage, data["coordinates_file"], coordinates_cache)
+    elif "coordinates" in data:
+        data["coordinates"] = _coordinate_levels(data["coordinates"])
+    data["reflectivity"] = _readonly(decode_sparse_frame(data["reflectivity"]))
+
+    published = data.pop("pyramid", None)
+    if published:
+        refl_levels = {int(size): decode_sparse_frame(level) for size, level in published.items()}
+        refl_levels[data["reflectivity"].shape[0]] = data["reflectivity"]
+    else:
+        refl_levels = frame_pyramid(data["reflectivity"])
+    coord_levels = data["coordinates"]["levels"]
+    data["levels"] = {
+        size: {
+            "lat": coord_levels[size]["lat"],
+            "lon": coord_levels[size]["lon"],
+            "reflectivity": _readonly(refl),
+        }
+        for size, refl in refl_levels.items()
+        if size in coord_levels
+    }
+    return data
+
+def _discover_run_via_listing(storage) -> Optional[str]:
+    """Fallback run key when latest.txt is missing: the earliest RAW frame name."""
+    names = sorted(f["name"] for f in storage.list() or [] if f.get("name", "").startswith("RAW"))
+    return f"listing:{names[0]}" if names else None
+
+def latest_run_id(force_refresh: bool = False) -> Optional[str]:
+    """
+    Returns the published run id from latest.txt. Cached for RUN_POINTER_TTL
+    seconds so sessions poll the pointer, not the frames.
+    """
+    now = time.monotonic()
+    if not force_refresh and now < _RUN_POINTER["expires"]:
+        return _RUN_POINTER["value"]
+
+    storage = _storage()
+    run_id = None
+    try:
+        contents = storage.download(LATEST_MARKER_PATH).decode("utf-8").strip()
+        run_id = contents.splitlines()[0].strip() if contents else None
+    except Exception:
+        run_id = None
+    if not run_id:
+        try:
+            run_id = _discover_run_via_listing(storage)
+        except Exception:
+            run_id = None
+
+    _RUN_POINTER["value"] = run_id
+    _RUN_POINTER["expires"] = now + RUN_POINTER_TTL
+    return run_id
+
+def _frame_valid_time(name: str) -> Optional[datetime]:
+    match = FRAME_NAME_RE.search(name)
+    if not match:
+        return None
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+
+def _run_base_time(run_id: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(run_id or "", "%Y%m%dT%H%MPHT")
+    except ValueError:
+        return None
+
+def _ordered_frame_names(storage, run_id) -> Tuple[list, list]:
+    """
+    RAW frame names sorted by the valid time in the filename, with lead
+    labels derived from that time instead of the listing order.
+    """
+    timed = []
+    for f in storage.list() or []:
+        name = f.get("name", "")
+        valid_time = _frame_valid_time(name) if name.startswith("RAW") else None
+        if valid_time is not None:
+            timed.append((valid_time, name))
+    timed.sort()
+    if not timed:
+        return [], []
+
+    base_time = _run_base_time(run_id) or timed[0][0] - timedelta(minutes=5)
+    labels = [f"+{round((valid_time - base_time).total_seconds() / 60)}min" for valid_time, _ in timed]
+    return [name for _, name in timed], labels
+
+def _manifest_frames(storage, run_id) -> Optional[Tuple[list, list, list]]:
+    """
+    (object paths, lead labels, per-frame metadata) from the run manifest's
+    "radar_frames" list, or None for runs published before frames were
+    content-addressed.
+    """
+    try:
+        manifest = json.loads(storage.download(f"{RUNS_PREFIX}/{run_id}/manifest.json").decode("utf-8"))
+    except Exception:
+        return None
+    frames = sorted((manifest.get("radar_frames") or {}).get("frames") or [], key=lambda f: f["lead_minutes"])
+    if not frames:
+        return None
+    metadata = [
+        {"run_id": run_id, "lead_time": frame["lead_time"], "valid_datetime": frame.get("valid_datetime")}
+        for frame in frames
+    ]
+    return [frame["object_path"] for frame in frames], [frame["lead_time"] for frame in frames], metadata
+
+def iter_run_frames(storage, names, labels, metadata=None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Download every frame concurrently over the shared client and yield
+    (lead_label, frame) in lead order as soon as each one is ready, so the
+    first lead is available before the last download finishes. metadata,
+    when given, is merged into each frame's "metadata" (content-addressed
+    frames do not carry their run or lead).
+    """
+    coordinates_cache = {}
+
+    def _fetch(name, extra):
+        data = json.loads(storage.download(name).decode("utf-8"))
+        if extra:
+            data.setdefault("metadata", {}).update(extra)
+        return decode_radar_frame(data, storage, coordinates_cache)
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        futures = [pool.submit(_fetch, name, extra) for name, extra in zip(names, metadata or [None] * len(names))]
+        for label, future in zip(labels, futures):
+            yield label, future.result()
+
+def _run_problem(run_id: str, predicted_data: Dict[str, Dict[str, Any]], from_listing: bool = False) -> Optional[str]:
+    """
+    Why a downloaded run cannot be served, or None when it is complete.
+    Frames from the root listing predate per-frame run ids; their leads come
+    from the valid times in their names, so a listing that mixes two runs
+    shows up as leads beyond the expected ones.
+    """
+    missing = [label for label in EXPECTED_LEADS if label not in predicted_data]
+    if missing:
+        return f"missing leads {', '.join(missing)}"
+    if from_listing:
+        extra = [label for label in predicted_data if label not in EXPECTED_LEADS]
+        return f"frames at unexpected leads {', '.join(extra)}" if extra else None
+    frame_runs = {(frame.get("metadata") or {}).get("run_id") for frame in predicted_data.values()}
+    if frame_runs != {run_id}:
+        return f"frames from runs {sorted(map(str, frame_runs))}"
+    return None
+
+def load_run(run_id: str, on_frame: Optional[Callable[[str, int, int, Dict[str, Any]], None]] = None):
+    """
+    Frames of run_id from the shared cache, downloading them on first use.
+    Returns None when the run cannot be served yet: a frame failed to
+    download, a lead is missing or frames belong to another run (the root
+    listing during a publish). Such runs are not cached, and are retried
+    at most every INCOMPLETE_RETRY seconds.
+    """
+    with _CACHE_LOCK:
+        if run_id in _RUN_CACHE:
+            _RUN_CACHE.move_to_end(run_id)
+            return _RUN_CACHE[run_id]
+        if time.monotonic() < _INCOMPLETE.get(run_id, 0.0):
+            return None
+
+    # One download per run, however many sessions ask for it at once
+    with _LOAD_LOCK:
+        with _CACHE_LOCK:
+            if run_id in _RUN_CACHE:
+                return _RUN_CACHE[run_id]
+        storage = _storage()
+        predicted_data = {}
+        try:
+            sources = _manifest_frames(storage, run_id)
+            if sources is not None:
+                names, labels, metadata = sources
+            else:
+                names, labels = _ordered_frame_names(storage, run_id)
+                metadata = None
+            for label, frame in iter_run_frames(storage, names, labels, metadata):
+                predicted_data[label] = frame
+                if on_frame is not None:
+                    on_frame(label, len(predicted_data), len(names), frame)
+            problem = _run_problem(run_id, predicted_data, from_listing=sources is None)
+        except Exception as exc:
+            problem = f"download failed: {exc}"
+        with _CACHE_LOCK:
+            if problem is not None:
+                _INCOMPLETE[run_id] = time.monotonic() + INCOMPLETE_RETRY
+                print(f"⚠️ Not serving run {run_id}: {problem}")
+                return None
+            _INCOMPLETE.pop(run_id, None)
+            _RUN_CACHE[run_id] = predicted_data
+            while len(_RUN_CACHE) > MAX_CACHED_RUNS:
+                evicted_run, _ = _RUN_CACHE.popitem(last=False)
+                _POINT_INDEX.pop(evicted_run, None)
     return predicted_data
+
+def _served_run(run_id: Optional[str], on_frame=None) -> Tuple[Optional[str], Dict[str, Any]]:
+    """(run id, frames) actually served for run_id: the run itself, or the newest cached one."""
+    run_id = run_id or latest_run_id()
+    predicted_data = load_run(run_id, on_frame) if run_id else None
+    if predicted_data is not None:
+        return run_id, predicted_data
+    with _CACHE_LOCK:
+        if _RUN_CACHE:
+            previous_run = next(reversed(_RUN_CACHE))
+            return previous_run, _RUN_CACHE[previous_run]
+    return None, {}
+
+def get_forecast(
+    run_id: Optional[str] = None,
+    on_frame: Optional[Callable[[str, int, int, Dict[str, Any]], None]] = None,
+):
+    """
+    Return the frames of a run from the process-wide cache, downloading
+    them on first use. Frames are shared by reference across sessions and
+    must be treated as read-only. At most MAX_CACHED_RUNS runs are kept.
+    While a run is incomplete (see load_run) the previously cached run is
+    served instead, or {} when there is none.
+    on_frame(label, loaded, total, frame) is called in lead order as frames
+    arrive on a cold load, so the first lead can be drawn before the rest.
+    """
+    return _served_run(run_id, on_frame)[1]
+
+def _build_point_index(predicted_data):
+    """KD-tree over the grid cells plus a (lead, cell) reflectivity cube."""
+    labels = list(predicted_data)
+    coords = predicted_data[labels[0]]["coordinates"]
+    cells = np.column_stack((np.ravel(coords["lat"]), np.ravel(coords["lon"])))
+    cube = np.stack([np.ravel(predicted_data[label]["reflectivity"]) for label in labels])
+    return {"labels": labels, "tree": cKDTree(cells), "cube": _readonly(cube)}
+
+def point_series(lat, lon, run_id: Optional[str] = None):
+    """
+    Reflectivity time series at the grid cell nearest to (lat, lon).
+    Returns (lead_labels, values); the index is built once per run.
+    """
+    run_id, predicted_data = _served_run(run_id)
+    if not predicted_data:
+        return [], np.empty(0)
+
+    with _CACHE_LOCK:
+        index = _POINT_INDEX.get(run_id)
+        if index is None:
+            index = _build_point_index(predicted_data)
+            _POINT_INDEX[run_id] = index
+
+    _, cell = index["tree"].query((lat, lon))
+    return index["labels"], index["cube"][:, cell]
+
+def generate_radar_data(on_frame=None):
+    """Frames of the latest published run, keyed by lead label ("+5min", ...)."""
+    return get_forecast(on_frame=on_frame)
+
+def served_radar_data(on_frame=None) -> Tuple[Optional[str], Dict[str, Any]]:
+    """(run id, frames) as generate_radar_data serves them, with the run actually shown."""
+    return _served_run(None, on_frame)
+
+def _poll_run_pointer(session, url) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """
+    Conditional GET of latest.txt. Returns (run_id, etag) when the pointer
+    changed since the last accepted poll, or None when it is unchanged
+    (HTTP 304). The caller stores the ETag once it has acted on the run.
+    """
+    headers = {"If-None-Match": _WATCHER["etag"]} if _WATCHER["etag"] else {}
+    response = session.get(url, headers=headers, timeout=5)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    contents = response.text.strip()
+    run_id = contents.splitlines()[0].strip() if contents else None
+    return run_id, response.headers.get("ETag")
+
+def _watch_runs():
+    session = requests.Session()
+    url = _storage().get_public_url(LATEST_MARKER_PATH)
+    while True:
+        try:
+            polled = _poll_run_pointer(session, url)
+            if polled is not None:
+                run_id, etag = polled
+                if run_id and run_id != _RUN_POINTER["value"]:
+                    # Warm the shared cache first so no session waits on the download
+                    if load_run(run_id) is None:
+                        raise RuntimeError(f"run {run_id} is not complete yet")
+                    _RUN_POINTER["value"] = run_id
+                if run_id:
+                    # Only a pointer we have acted on stops later polls and
+                    # defers latest_run_id's own re-read
+                    _WATCHER["etag"] = etag
+                    _RUN_POINTER["expires"] = time.monotonic() + RUN_POINTER_TTL
+        except Exception as exc:
+            # Poll again in full next time instead of trusting a 304
+            _WATCHER["etag"] = None
+            print(f"⚠️ Run watcher poll failed: {exc}")
+        time.sleep(WATCH_INTERVAL)
+
+def start_run_watcher():
+    """Start the per-process background watcher once; later calls are no-ops."""
+    with _WATCHER_LOCK:
+        if _WATCHER["thread"] is None:
+            thread = threading.Thread(target=_watch_runs, name="rainloop-run-watcher", daemon=True)
+            thread.start()
+            _WATCHER["thread"] = thread
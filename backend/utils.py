@@ -86,4 +86,100 @@ def get_reflectivity_data(dataset_dict, flat_list):
         else:
             raise KeyError(f"Key {key} not found in the dataset.")
     reflectivity_data = np.array(reflectivity_data).squeeze()
-    return reflectivity_data
\ No newline at end of file
+    return reflectivity_data
+
+# sparse frame encodings (cost measured in stored numbers)
+SPARSE_ENCODINGS = ("coo", "rle", "dense")
+
+# encode a reflectivity frame using whichever of COO / RLE / dense is smallest
+def encode_sparse_frame(frame, decimals=2):
+    """
+    Encode a 2D frame as a JSON-friendly dict.
+
+    - "coo":   flat indices + values of the non-zero cells
+    - "rle":   (start, length) runs of non-zero cells + their values
+    - "dense": every value, row-major
+
+    The encoding is picked per frame from the non-zero density, so clear
+    frames collapse to a handful of bytes and busy frames stay dense.
+    """
+    arr = np.asarray(frame, dtype=np.float64)
+    if decimals is not None:
+        arr = np.round(arr, decimals)
+    arr = np.where(np.isfinite(arr), arr, 0.0)
+    flat = arr.reshape(-1)
+
+    nonzero = np.flatnonzero(flat)
+    padded = np.concatenate(([False], flat != 0, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    run_starts, run_ends = edges[0::2], edges[1::2]
+
+    costs = {
+        "coo": 2 * nonzero.size,
+        "rle": 2 * run_starts.size + nonzero.size,
+        "dense": flat.size,
+    }
+    encoding = min(SPARSE_ENCODINGS, key=lambda name: costs[name])
+
+    payload = {"encoding": encoding, "shape": list(arr.shape)}
+    if encoding == "coo":
+        payload["indices"] = nonzero.tolist()
+        payload["values"] = flat[nonzero].tolist()
+    elif encoding == "rle":
+        payload["starts"] = run_starts.tolist()
+        payload["lengths"] = (run_ends - run_starts).tolist()
+        payload["values"] = flat[nonzero].tolist()
+    else:
+        payload["values"] = flat.tolist()
+    return payload
+
+# decode a frame produced by encode_sparse_frame (dense nested lists pass through)
+def decode_sparse_frame(payload, dtype=np.float32):
+    if not isinstance(payload, dict):
+        return np.asarray(payload, dtype=dtype)
+
+    shape = tuple(payload["shape"])
+    encoding = payload.get("encoding")
+    values = np.asarray(payload.get("values", []), dtype=dtype)
+    if encoding == "dense":
+        return values.reshape(shape)
+
+    flat = np.zeros(int(np.prod(shape)), dtype=dtype)
+    if encoding == "coo":
+        flat[np.asarray(payload["indices"], dtype=np.int64)] = values
+    elif encoding == "rle":
+        starts = np.asarray(payload["starts"], dtype=np.int64)
+        lengths = np.asarray(payload["lengths"], dtype=np.int64)
+        # index of every non-zero cell: run start + position within the run
+        run_offsets = np.cumsum(lengths) - lengths
+        positions = np.arange(int(lengths.sum()), dtype=np.int64)
+        flat[np.repeat(starts - run_offsets, lengths) + positions] = values
+    else:
+        raise ValueError(f"Unsupported sparse frame encoding: {encoding}")
+    return flat.reshape(shape)
+
+# downsampling factors published alongside each full-resolution frame
+PYRAMID_FACTORS = (2, 4)
+
+# block-max pooling keeps rain peaks visible at coarse resolutions
+def block_max_pool(frame, factor):
+    arr = np.asarray(frame)
+    h, w = (arr.shape[0] // factor) * factor, (arr.shape[1] // factor) * factor
+    blocks = arr[:h, :w].reshape(h // factor, factor, w // factor, factor)
+    return blocks.max(axis=(1, 3))
+
+# block-mean pooling gives the centre of each pooled cell for coordinate grids
+def block_mean_pool(grid, factor):
+    arr = np.asarray(grid, dtype=np.float64)
+    h, w = (arr.shape[0] // factor) * factor, (arr.shape[1] // factor) * factor
+    blocks = arr[:h, :w].reshape(h // factor, factor, w // factor, factor)
+    return blocks.mean(axis=(1, 3))
+
+# frame pyramid keyed by grid size, e.g. {240: full, 120: 2x2 max, 60: 4x4 max}
+def frame_pyramid(frame, pool=block_max_pool, factors=PYRAMID_FACTORS):
+    arr = np.asarray(frame)
+    levels = {arr.shape[0]: arr}
+    for factor in factors:
+        pooled = pool(arr, factor)
+        levels[pooled.shape[0]] = pooled
+    return levels
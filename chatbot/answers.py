@@ -0,0 +1,109 @@
+# chatbot/answers.py
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from chatbot.cache import TTLCache
+from chatbot.location_lookup import query_terms
+
+MAX_CACHED_ANSWERS = 2048
+# Answers live until the run's last forecast slot, within these bounds (seconds)
+MIN_ANSWER_TTL = 60.0
+MAX_ANSWER_TTL = 3 * 60 * 60.0
+
+# Keyword groups that change what a good answer looks like; anything else
+# about the same place and time gets the same answer
+INTENT_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "umbrella": ("umbrella", "raincoat", "jacket", "wet"),
+    "travel": ("drive", "driving", "commute", "travel", "road", "roads", "traffic", "flight", "trip"),
+    "outdoor": ("outside", "outdoor", "outdoors", "run", "jog", "walk", "bike", "picnic", "game", "laundry"),
+    "safety": ("safe", "danger", "dangerous", "flood", "flooding", "storm", "warning", "evacuate"),
+    # Word forms matched by chatbot.rain_summary.RE_SUMMARY_QUESTION
+    "stop": ("stop", "stops", "end", "ends", "ease", "eases", "clear", "clears", "until", "till"),
+    "start": ("start", "starts", "starting", "begin", "begins", "when"),
+    "peak": ("worst", "peak", "heaviest", "strongest", "max", "maximum"),
+}
+RE_WINDOW_WORDS = re.compile(r"\b(?:over|within|during|throughout|for)\s+(?:the\s+)?next\b", re.I)
+
+_ANSWER_CACHE = TTLCache("answers", max_entries=MAX_CACHED_ANSWERS)
+_RUN_LOCK = threading.Lock()
+_CURRENT_RUN: Dict[str, Optional[str]] = {"value": None}
+
+
+def query_intent(query: str, window_minutes: Optional[int] = None, outlook: bool = False) -> str:
+    """
+    Coarse intent label for a question, independent of the place and time it
+    names: 'forecast', 'umbrella', 'travel', ... plus ':window<N>' for
+    timeline questions and ':outlook' when the answer uses the run's
+    onset/peak summary.
+    """
+    tokens = set(query_terms(RE_WINDOW_WORDS.sub(" ", query))[1])
+    labels = sorted(label for label, words in INTENT_KEYWORDS.items() if tokens.intersection(words))
+    intent = "+".join(labels) or "forecast"
+    if window_minutes:
+        intent += f":window{int(window_minutes)}"
+    if outlook:
+        intent += ":outlook"
+    return intent
+
+
+def answer_key(
+    run_id: str,
+    normalized_place: str,
+    lead_minutes: int,
+    query: str,
+    window_minutes: Optional[int] = None,
+    outlook: bool = False,
+) -> Tuple[str, str, int, str]:
+    """Cache key for an answer; outlook is whether the prompt carried the run's summary."""
+    return run_id, normalized_place, int(lead_minutes), query_intent(query, window_minutes, outlook)
+
+
+def answer_ttl(last_valid_utc: Optional[datetime]) -> float:
+    """Seconds until the run's last forecast slot, clamped to sane bounds."""
+    if last_valid_utc is None:
+        return MAX_ANSWER_TTL
+    remaining = (last_valid_utc - datetime.now(timezone.utc)).total_seconds()
+    return min(MAX_ANSWER_TTL, max(MIN_ANSWER_TTL, remaining))
+
+
+def _forget_older_runs(run_id: str) -> None:
+    with _RUN_LOCK:
+        if _CURRENT_RUN["value"] == run_id:
+            return
+        _CURRENT_RUN["value"] = run_id
+    _ANSWER_CACHE.drop_where(lambda key: key[0] != run_id)
+
+
+def cached_answer(key: Tuple[str, str, int, str]) -> Optional[str]:
+    """A finished answer for key, or None. Does not wait for one in flight."""
+    _forget_older_runs(key[0])
+    return _ANSWER_CACHE.get(key)
+
+
+def get_or_generate_answer(
+    key: Tuple[str, str, int, str],
+    generate: Callable[[], Tuple[str, bool]],
+    ttl: float,
+) -> Tuple[str, bool]:
+    """
+    Return (answer, from_cache). On a miss generate() runs once per key even
+    when several sessions ask at the same moment; the others wait for it and
+    reuse its answer. generate returns (text, complete); answers that are not
+    complete (templated fallbacks, interrupted streams) are handed to the
+    waiters but not kept for later questions. Since the answer is served to
+    every session, generate must not use any one session's chat history.
+    """
+    _forget_older_runs(key[0])
+    generated: Dict[str, Any] = {}
+
+    def _load():
+        text, complete = generate()
+        generated["complete"] = complete
+        return text
+
+    answer = _ANSWER_CACHE.get_or_load(key, _load, ttl=ttl)
+    if generated and not generated["complete"]:
+        _ANSWER_CACHE.pop(key)
+    return answer, not generated
@@ -0,0 +1,129 @@
+# chatbot/bench_location_lookup.py
+"""
+Benchmark of the indexed rank_locations against the linear scan it replaced.
+
+    python -m chatbot.bench_location_lookup --locations 100000 --compare 48
+
+Builds a LocationIndex over synthetic place names, times indexed queries and
+checks a sample of them against rank_locations over the plain list, which
+scores every location, so --compare queries take seconds each at 100k.
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from chatbot.location_lookup import LocationIndex, normalize_place_name, rank_locations
+
+SYLLABLES = [
+    "chey", "enne", "lar", "amie", "fort", "coll", "ins", "bur", "ton", "ville",
+    "ro", "ck", "spr", "ings", "gree", "ley", "wel", "lington", "cas", "per",
+    "ash", "land", "mid", "dle", "ra", "wlins", "lan", "der", "sher", "idan",
+]
+PREFIXES = ["Fort", "Lake", "Mount", "North", "East"]
+STATES = ["Wyoming", "Colorado", "Nebraska", "Montana", "Utah", "South Dakota"]
+QUERY_STYLES = ("name", "name + state", "typo", "prefix")
+
+
+def synthetic_locations(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Manifest-shaped locations with made-up, often similar, names."""
+    counties = [f"{rng.choice(SYLLABLES).title()}{rng.choice(SYLLABLES)} County" for _ in range(300)]
+    locations = []
+    seen: Dict[str, int] = {}
+    for idx in range(count):
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).title()
+        if rng.random() < 0.2:
+            name = f"{rng.choice(PREFIXES)} {name}"
+        place = f"{name}, {rng.choice(counties)}, {rng.choice(STATES)}"
+        slug = normalize_place_name(place)
+        duplicates = seen.get(slug, 0)
+        seen[slug] = duplicates + 1
+        locations.append({
+            "place": place,
+            "normalized_place": slug if not duplicates else f"{slug}-{duplicates}",
+            "location_index": idx,
+        })
+    return locations
+
+
+def sample_queries(locations: List[Dict[str, Any]], count: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """(style, question) pairs cycling through QUERY_STYLES."""
+    queries = []
+    for loc in rng.sample(locations, (count + len(QUERY_STYLES) - 1) // len(QUERY_STYLES)):
+        name = loc["place"].split(",")[0]
+        state = loc["place"].split(",")[-1].strip()
+        cut = rng.randrange(1, len(name) - 1)
+        queries += [
+            ("name", f"weather in {name} in 30 mins"),
+            ("name + state", f"will it rain in {name.lower()} {state}"),
+            ("typo", f"rain in {name.lower()[:cut] + name.lower()[cut + 1:]}"),
+            ("prefix", name[: max(4, len(name) - 3)]),
+        ]
+    return queries[:count]
+
+
+def _same_top(old: List[Tuple[float, Dict[str, Any]]], new: List[Tuple[float, Dict[str, Any]]]) -> bool:
+    if not old or not new:
+        return not old and not new
+    # Equal scores are interchangeable apart from the place-name tie order
+    return old[0][1] is new[0][1] or old[0][0] == new[0][0]
+
+
+def _describe(ranked: List[Tuple[float, Dict[str, Any]]]) -> str:
+    return ", ".join(f"{loc['place']} ({score:.2f})" for score, loc in ranked[:2]) or "-"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--locations", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=800)
+    parser.add_argument("--compare", type=int, default=24, help="queries also run through the linear scan")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="timings per query; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    locations = synthetic_locations(args.locations, rng)
+    started = time.perf_counter()
+    index = LocationIndex(locations)
+    print(f"index: {len(index)} locations, {len(index.postings)} tokens, built in {time.perf_counter() - started:.2f} s")
+
+    queries = sample_queries(locations, args.queries, rng)
+    timings: Dict[str, List[float]] = {style: [] for style in QUERY_STYLES}
+    for style, query in queries:
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            started = time.perf_counter()
+            rank_locations(query, index, limit=args.limit)
+            runs.append(time.perf_counter() - started)
+        timings[style].append(min(runs))
+    for style, values in [("all", sorted(t for v in timings.values() for t in v))] + list(timings.items()):
+        values = sorted(values)
+        print(
+            f"indexed {style:>12}: median {statistics.median(values) * 1e3:.3f} ms, "
+            f"p95 {values[int(len(values) * 0.95)] * 1e3:.3f} ms over {len(values)} queries"
+        )
+
+    # Spread the comparison over every query style
+    compared = queries[: args.compare]
+    top1 = identical = 0
+    linear_times = []
+    for style, query in compared:
+        started = time.perf_counter()
+        old = rank_locations(query, locations, limit=args.limit)
+        linear_times.append(time.perf_counter() - started)
+        new = rank_locations(query, index, limit=args.limit)
+        identical += [score for score, _ in old] == [score for score, _ in new]
+        if _same_top(old, new):
+            top1 += 1
+        else:
+            print(f"differs ({style}): {query!r}\n  linear: {_describe(old)}\n  indexed: {_describe(new)}")
+    if compared:
+        print(f"linear scan: median {statistics.median(linear_times) * 1e3:.1f} ms")
+        print(f"same top result: {top1}/{len(compared)}, same top-{args.limit} scores: {identical}/{len(compared)}")
+
+
+if __name__ == "__main__":
+    main()
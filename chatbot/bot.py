@@ -1,23 +1,21 @@
 # chatbot/bot.py
-import math
 from pathlib import Path
 import streamlit as st
 from datetime import datetime, timedelta, timezone
 
+from chatbot.answers import answer_key, answer_ttl, cached_answer, get_or_generate_answer
 from chatbot.session import get_chat_session, clear_chat_session
-from chatbot.query_time import extract_offset_minutes
-from chatbot.supabase_ops import (
-    latest_complete_run_dir,
-    load_manifest,
-    fetch_record_json,
-    resolve_offset_for_location,
-)
-from chatbot.location_lookup import rank_locations
+from chatbot.pipeline import QueryError, plan_query
+from chatbot.streaming import stream_answer, templated_answer
+from chatbot.query_time import extract_offset_minutes, extract_window_minutes
+from chatbot.rain_summary import summary_lines
 
 # Absolute path to assistant avatar image (define before set_page_config)
 ASSISTANT_AVATAR = str((Path(__file__).resolve().parent.parent / "assets" / "finalicon.png"))
 
 MANILA_TZ = timezone(timedelta(hours=8))
+# Newest messages drawn on each rerun; older ones load a page at a time
+HISTORY_PAGE_SIZE = 20
 
 st.set_page_config(page_title="RainLoop AI Assistant", page_icon=ASSISTANT_AVATAR, layout="wide")
 
@@ -34,9 +32,18 @@ def _ensure_session_state():
             st.session_state["chat_session"] = None
 
 
-def _append_message(role: str, avatar: str, content: str):
+def _append_message(role: str, avatar: str, content: str) -> dict:
     st.session_state.setdefault("messages", [])
-    st.session_state["messages"].append({"role": role, "avatar": avatar, "content": content})
+    message = {"role": role, "avatar": avatar, "content": content}
+    st.session_state["messages"].append(message)
+    return message
+
+
+def _history_window(messages: list) -> tuple:
+    """(number of hidden older messages, visible newest messages)."""
+    visible = max(HISTORY_PAGE_SIZE, int(st.session_state.get("history_visible", HISTORY_PAGE_SIZE)))
+    hidden = max(0, len(messages) - visible)
+    return hidden, messages[hidden:]
 
 
 # ---------------- Utility functions ----------------
@@ -45,34 +52,6 @@ def _format_local(dt: datetime) -> str:
     return dt.astimezone(MANILA_TZ).strftime("%Y-%m-%d %I:%M %p %Z")
 
 
-def _parse_iso_to_utc(value: str) -> datetime:
-    cleaned = (value or "").strip()
-    if not cleaned:
-        raise ValueError("Datetime string is empty")
-    if cleaned.endswith("Z"):
-        cleaned = cleaned[:-1] + "+00:00"
-    dt = datetime.fromisoformat(cleaned)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
-
-
-def _select_best_slot(slots, target_dt: datetime):
-    if not slots:
-        raise ValueError("No forecast slots are available.")
-    target_dt = target_dt.astimezone(timezone.utc)
-    best = None
-    best_key = (float("inf"), True)
-    for slot in slots:
-        valid_dt = slot["valid_dt_utc"].astimezone(timezone.utc)
-        diff_seconds = (valid_dt - target_dt).total_seconds()
-        key = (abs(diff_seconds), diff_seconds < 0)
-        if key < best_key:
-            best_key = key
-            best = slot
-    return best
-
-
 def _display_run_freshness(base_time_utc: datetime):
     """Compute staleness and age in minutes.
 
@@ -96,29 +75,45 @@ def run_chatbot():
     col1, col2, col3 = st.columns([12, 2, 2], gap="small")
     with col1:
         st.markdown("### RainLoop AI Assistant - Ask me...")
-        st.caption("Nowcast update every 5-minute steps. Examples: `in 5 mins`, `in 10 mins`.")
+        st.caption("Nowcast update every 5-minute steps. Examples: `in 5 mins`, `in 10 mins`, `over the next hour`.")
     with col2:
         if st.button("Restart"):
             st.session_state["messages"] = []
+            st.session_state.pop("history_visible", None)
             clear_chat_session()
             st.success("Reset!")
     with col3:
         if st.button("Clear"):
             st.session_state["messages"] = []
+            st.session_state.pop("history_visible", None)
             st.success("Clear!")
 
     summary_placeholder = st.empty()
-    history_placeholder = st.empty()
+    history_container = st.container()
+    # Messages posted during this run are drawn here once, below the history,
+    # instead of redrawing the whole conversation after each step
+    live_container = st.container()
     alert_placeholder = st.empty()
     status_placeholder = st.empty()
 
     def _render_history():
-        history_placeholder.empty()
-        with history_placeholder.container():
-            for msg in st.session_state.get("messages", []):
+        """Draw the newest page of history once per run, older pages on request."""
+        hidden, visible = _history_window(st.session_state.get("messages", []))
+        with history_container:
+            if hidden:
+                page = min(HISTORY_PAGE_SIZE, hidden)
+                if st.button(f"Show {page} earlier messages ({hidden} hidden)", key="history_more"):
+                    st.session_state["history_visible"] = len(visible) + page
+                    st.rerun()
+            for msg in visible:
                 with st.chat_message(msg["role"], avatar=msg["avatar"]):
                     st.markdown(msg["content"])
-        _render_summary()
+
+    def _post_message(role: str, avatar: str, content: str):
+        msg = _append_message(role, avatar, content)
+        with live_container:
+            with st.chat_message(msg["role"], avatar=msg["avatar"]):
+                st.markdown(msg["content"])
 
     def _render_summary():
         summary_placeholder.empty()
@@ -128,7 +123,7 @@ def run_chatbot():
         freshness_icon = "✅" 
         lines = [
             f"Base Time of Last Predictions : {summary.get('base_time_local','?')}",
-            f"Requested Time: {summary.get("requested_local", "?")}",
+            f"Requested Time: {summary.get('requested_local', '?')}",
             f"Chosen Predicted Time for Query : {summary.get('valid_local','?')}",
             f"Place: {summary.get('place','?')}",
             f"Reflectivity: {summary.get('reflectivity','?')} dBZ",
@@ -155,208 +150,67 @@ def run_chatbot():
         summary_placeholder.empty()
 
     _render_history()
+    _render_summary()
     _alert_clear()
 
     query = st.chat_input("Ask: 'How will the weather in Wyoming in 2 hours?' or 'in 30 mins'")
 
     if not query:
         _clear_summary()
-        _render_history()
         return
 
     timestamp = datetime.now(MANILA_TZ).strftime("%I:%M %p")
     user_msg = f"**[{timestamp}]** {query}"
-    _append_message("user", "🧑‍💻", user_msg)
-    _render_history()
+    _post_message("user", "🧑‍💻", user_msg)
 
     _status_replace("⏳ Fetching nowcast data…")
 
     offset_minutes = extract_offset_minutes(query) or 0
+    window_minutes = extract_window_minutes(query)
 
-    try:
-        run_id = latest_complete_run_dir()
-        if not run_id:
-            raise RuntimeError("No completed forecast run available yet.")
-        manifest = load_manifest(run_id)
-    except Exception as exc:
-        _status_finish()
-        err = f"⚠️ Unable to load forecast run: {exc}"
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
+    # A newer question supersedes the previous one's background warm-up
+    previous_prefetch = st.session_state.pop("prefetch_future", None)
+    if previous_prefetch is not None:
+        previous_prefetch.cancel()
 
     try:
-        base_time_iso = manifest.get("base_time_utc") or manifest["base_time"]
-        base_time_utc = datetime.fromisoformat(base_time_iso)
-        if base_time_utc.tzinfo is None:
-            base_time_utc = base_time_utc.replace(tzinfo=timezone.utc)
-        else:
-            base_time_utc = base_time_utc.astimezone(timezone.utc)
-        base_time_local = base_time_utc.astimezone(MANILA_TZ)
-    except Exception as exc:
-        _status_finish()
-        err = f"⚠️ Manifest is missing base_time: {exc}"
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
-
-    lead_bins = manifest.get("lead_bins") or []
-    files = manifest.get("files") or {}
-    available_slots = []
-
-    for filename, entry in files.items():
-        if not isinstance(filename, str) or not filename.endswith(".jsonl"):
-            continue
-        lead_value = entry.get("lead_minutes")
-        valid_iso = entry.get("valid_time_utc") or entry.get("valid_time")
-        valid_dt_utc = None
-
-        if isinstance(valid_iso, str):
-            try:
-                valid_dt_utc = _parse_iso_to_utc(valid_iso)
-            except Exception:
-                valid_dt_utc = None
-
-        if valid_dt_utc is None and lead_value is not None:
-            try:
-                valid_dt_utc = base_time_utc + timedelta(minutes=int(lead_value))
-            except Exception:
-                valid_dt_utc = None
-
-        if valid_dt_utc is None:
-            continue
-
-        try:
-            lead_int = int(lead_value)
-        except Exception:
-            diff_minutes = (valid_dt_utc - base_time_utc).total_seconds() / 60.0
-            lead_int = int(round(diff_minutes))
-
-        available_slots.append(
-            {
-                "filename": filename,
-                "entry": entry,
-                "lead_minutes": lead_int,
-                "valid_dt_utc": valid_dt_utc,
-                "valid_time_label": entry.get("valid_time_label"),
-            }
+        plan = plan_query(
+            query,
+            offset_minutes,
+            window_minutes,
+            marker=st.session_state.get("marker_location"),
+            cached_location=st.session_state.get("latest_location"),
         )
-
-    if not available_slots and lead_bins:
-        for minutes in lead_bins:
-            try:
-                minutes_int = int(minutes)
-            except Exception:
-                continue
-            legacy_name = f"lead_{minutes_int:03d}.jsonl"
-            entry = files.get(legacy_name)
-            if not entry:
-                continue
-            valid_dt_utc = base_time_utc + timedelta(minutes=minutes_int)
-            available_slots.append(
-                {
-                    "filename": legacy_name,
-                    "entry": entry,
-                    "lead_minutes": minutes_int,
-                    "valid_dt_utc": valid_dt_utc,
-                    "valid_time_label": entry.get("valid_time_label")
-                    or valid_dt_utc.astimezone(MANILA_TZ).strftime("%Y%m%dT%H%MPHT"),
-                }
-            )
-
-    if not available_slots:
-        _status_finish()
-        err = "⚠️ Manifest has no forecast time slots."
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
-
-    available_slots.sort(key=lambda slot: slot["valid_dt_utc"])
-    target_dt_utc = datetime.now(timezone.utc) + timedelta(minutes=offset_minutes)
-    try:
-        selected_slot = _select_best_slot(available_slots, target_dt_utc)
-    except Exception as exc:
+    except QueryError as exc:
         _status_finish()
-        err = f"⚠️ Unable to pick forecast slot: {exc}"
+        err = str(exc)
         _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
+        _post_message("assistant", ASSISTANT_AVATAR, err)
         _clear_summary()
-        _render_history()
         return
+    st.session_state["prefetch_future"] = plan["prefetch"]
+
+    run_id = plan["run_id"]
+    slot_table = plan["slot_table"]
+    base_time_utc = slot_table.base_time_utc
+    base_time_local = base_time_utc.astimezone(MANILA_TZ)
+    target_dt_utc = plan["target_dt_utc"]
+    selected_slot = plan["selected_slot"]
+    timeline_slots = plan["timeline_slots"]
+    timeline_records = plan["timeline_records"]
+    record = plan["record"]
+    location_entry = plan["location"]
+    normalized_place = plan["normalized_place"]
+    score_display = plan["score_display"]
+    # None when the run's summary record replaced the per-slot timeline
+    window_minutes = plan["window_minutes"]
+    st.session_state["latest_location"] = location_entry
 
     lead_minutes = selected_slot["lead_minutes"]
     lead_filename = selected_slot["filename"]
-    file_entry = selected_slot["entry"]
     valid_dt_utc = selected_slot["valid_dt_utc"]
     valid_label = selected_slot.get("valid_time_label")
 
-    locations = manifest.get("locations") or []
-    matches = rank_locations(query, locations)
-    cached_location = st.session_state.get("latest_location")
-    used_cached_location = False
-
-    if matches:
-        best_score, location_entry = matches[0]
-        st.session_state["latest_location"] = location_entry
-    elif cached_location:
-        location_entry = cached_location
-        best_score = float("nan")
-        used_cached_location = True
-    else:
-        _status_finish()
-        err = "⚠️ I couldn't find that place in the latest forecast data."
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
-    if used_cached_location or (isinstance(best_score, float) and math.isnan(best_score)):
-        score_display = "previous query"
-    else:
-        score_display = f"{best_score:.2f}"
-    normalized_place = location_entry.get("normalized_place")
-    if not normalized_place:
-        _status_finish()
-        err = "⚠️ Selected location is missing a normalized key."
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
-
-    try:
-        offset, length = resolve_offset_for_location(
-            run_id=run_id,
-            filename=lead_filename,
-            file_entry=file_entry,
-            location_index=int(location_entry.get("location_index", -1)),
-        )
-    except Exception as exc:
-        _status_finish()
-        err = f"⚠️ No record found for `{normalized_place}` in {lead_filename} ({exc})."
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _clear_summary()
-        _render_history()
-        return
-
-    try:
-        record = fetch_record_json(run_id, lead_filename, offset, length)
-    except Exception as exc:
-        _status_finish()
-        err = f"⚠️ Unable to download forecast record: {exc}"
-        _alert_warning(err)
-        _append_message("assistant", ASSISTANT_AVATAR, err)
-        _render_history()
-        _clear_summary()
-        return
-
     valid_when_local = _format_local(valid_dt_utc)
     target_when_local = _format_local(target_dt_utc)
 
@@ -388,7 +242,7 @@ def run_chatbot():
         "requested_local": target_when_local,
     }
     st.session_state["forecast_summary"] = summary_data
-    _render_history()
+    _render_summary()
     
 
     context = (
@@ -402,28 +256,75 @@ def run_chatbot():
         f"Reflectivity (dBZ): {reflectivity}\n"
         f"Rain category: {rain_category}\n"
     )
+    if len(timeline_slots) > 1:
+        timeline_lines = [
+            f"- {_format_local(slot['valid_dt_utc'])} (+{slot['lead_minutes']} min): "
+            f"{rec.get('reflectivity')} dBZ, {rec.get('rain_category') or 'Unknown'}"
+            for slot, rec in zip(timeline_slots, timeline_records)
+        ]
+        context += f"Timeline over the next {window_minutes} minutes:\n" + "\n".join(timeline_lines) + "\n"
+    outlook = []
+    if plan["rain_summary"]:
+        outlook = summary_lines(plan["rain_summary"], base_time_utc, slot_table.last_valid_utc)
+        context += "Outlook for this run:\n" + "\n".join(f"- {line}" for line in outlook) + "\n"
 
     prompt = (
         "You are the RadarLoop Weather Assistant. Use the forecast record below to answer "
         "the user's weather question concisely, include rain intensity, and provide exactly three safety tips "
         "as a bulleted list (one sentence each). "
+        "When a timeline is given, describe how the rain changes across it. "
+        "When an outlook is given, use it for questions about when rain starts, stops or peaks. "
         "If the location does not exist in the record, reply that no information is available.\n\n"
         f"Forecast record:\n{context}\n"
         f"User question: {query}"
     )
 
-    _status_replace("🌧️ RainLoop AI Assistant generating answer...")
+    fallback = templated_answer(
+        place_name,
+        valid_when_local,
+        reflectivity,
+        rain_category,
+        timeline=[
+            {
+                "valid_local": _format_local(slot["valid_dt_utc"]),
+                "reflectivity": rec.get("reflectivity"),
+                "rain_category": rec.get("rain_category"),
+            }
+            for slot, rec in zip(timeline_slots, timeline_records)
+        ],
+        outlook=outlook,
+    )
+
+    key = answer_key(run_id, normalized_place, lead_minutes, query, window_minutes, outlook=bool(plan["rain_summary"]))
+    ttl = answer_ttl(slot_table.last_valid_utc)
 
-    try:
-        response = chat.send_message(prompt)
-        answer = response.text if hasattr(response, "text") else "⚠️ No response generated."
-    except Exception as exc:
-        answer = f"⚠️ Error generating response: {exc}"
-    finally:
+    def _generate():
+        # Stream the answer where the status line sits, then move it into history.
+        # The answer is cached for every session asking the same thing, so it is
+        # generated without this session's conversation
+        outcome = {}
+        shared_chat = chat.standalone() if chat is not None else None
         _status_finish()
+        with status_placeholder.container():
+            with st.chat_message("assistant", avatar=ASSISTANT_AVATAR):
+                text = st.write_stream(stream_answer(shared_chat, prompt, fallback, outcome=outcome))
+        if not isinstance(text, str):
+            text = "".join(str(part) for part in text or [])
+        status_placeholder.empty()
+        return text or fallback, bool(outcome.get("complete"))
 
-    _append_message("assistant", ASSISTANT_AVATAR, answer)
-    _render_history()
+    answer = cached_answer(key)
+    if answer is None:
+        _status_replace("🌧️ RainLoop AI Assistant generating answer...")
+        answer, _ = get_or_generate_answer(key, _generate, ttl)
+        _status_finish()
+    # Remember the answer as shown, cached or fresh, for follow-up questions.
+    # chat is None when the model could not be set up (e.g. no API key); the
+    # templated answer is still shown
+    if chat is not None:
+        chat.add_turn(prompt, answer)
+
+    _post_message("assistant", ASSISTANT_AVATAR, answer)
 
 
 if __name__ == "__main__":
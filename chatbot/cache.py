@@ -0,0 +1,196 @@
+# chatbot/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_MISSING = object()
+
+_REGISTRY: Dict[str, "TTLCache"] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache bounded by entry count, with an optional per-entry
+    time-to-live. Every Streamlit script thread in the process shares one
+    instance, so all reads and writes go through a single lock.
+
+    get_or_load() adds single-flight loading: concurrent misses on a key share
+    one loader call. With max_stale set, an expired entry younger than
+    ttl + max_stale is returned immediately while one background thread
+    refreshes it (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl: Optional[float] = None,
+        max_stale: float = 0.0,
+        load_timeout: float = 30.0,
+    ):
+        self.name = name
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.load_timeout = load_timeout
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._in_flight: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_errors = 0
+        with _REGISTRY_LOCK:
+            _REGISTRY[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires and time.monotonic() >= expires:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        force: bool = False,
+        ttl: Optional[float] = None,
+    ) -> Any:
+        """
+        Return the cached value for key, calling loader() on a miss. Only one
+        loader runs per key at a time; other callers wait for its result, or
+        take over if it fails. force skips the cached value but still joins a
+        load that is already in flight. ttl overrides the cache's default for
+        the loaded value.
+        """
+        while True:
+            with self._lock:
+                entry = self._data.get(key, _MISSING)
+                if entry is not _MISSING and not force:
+                    expires, value = entry
+                    now = time.monotonic()
+                    if not expires or now < expires:
+                        self._data.move_to_end(key)
+                        self.hits += 1
+                        return value
+                    if now < expires + self.max_stale:
+                        self._data.move_to_end(key)
+                        self.stale_hits += 1
+                        if key not in self._in_flight:
+                            event = threading.Event()
+                            self._in_flight[key] = event
+                            threading.Thread(
+                                target=self._load, args=(key, loader, event, ttl), daemon=True
+                            ).start()
+                        return value
+                event = self._in_flight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._in_flight[key] = event
+                    self.misses += 1
+                    break
+                self.coalesced += 1
+            event.wait(self.load_timeout)
+            force = False
+
+        return self._load(key, loader, event, ttl, raise_errors=True)
+
+    def _load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Any],
+        event: threading.Event,
+        ttl: Optional[float] = None,
+        raise_errors: bool = False,
+    ) -> Any:
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self.load_errors += 1
+            if raise_errors:
+                raise
+            # Background refresh failed; the stale entry keeps serving
+            return None
+        else:
+            with self._lock:
+                self.loads += 1
+            self.set(key, value, ttl=ttl)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            event.set()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[1]
+
+    def drop_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every key matching predicate; returns how many were dropped."""
+        with self._lock:
+            stale = [key for key in self._data if predicate(key)]
+            for key in stale:
+                del self._data[key]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "stale_hits": self.stale_hits,
+                "coalesced": self.coalesced,
+                "loads": self.loads,
+                "load_errors": self.load_errors,
+                "in_flight": len(self._in_flight),
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Counters for every cache created in this process, keyed by cache name."""
+    with _REGISTRY_LOCK:
+        caches = list(_REGISTRY.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,117 @@
+# chatbot/context.py
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+# Most recent question/answer pairs sent to the model word for word
+VERBATIM_TURNS = int(os.getenv("CHAT_VERBATIM_TURNS", "4"))
+# Upper bound on the digest of older turns (characters)
+MAX_SUMMARY_CHARS = int(os.getenv("CHAT_SUMMARY_CHARS", "1200"))
+# Upper bound on each verbatim question or answer (characters)
+MAX_TURN_CHARS = 2000
+# Length of one digest line's question and answer parts
+DIGEST_QUESTION_CHARS = 120
+DIGEST_ANSWER_CHARS = 160
+
+RE_RUN_ID = re.compile(r"^Run ID:\s*(\S+)", re.M)
+RE_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def split_prompt(prompt: str) -> Dict[str, Optional[str]]:
+    """
+    Pull the forecast record, user question and run id out of a prompt built
+    by chatbot.bot ("...Forecast record:\\n<record>\\nUser question: <q>").
+    Prompts in any other shape are treated as a bare question.
+    """
+    if "User question:" not in prompt:
+        return {"record": None, "question": prompt.strip(), "run_id": None}
+    head, question = prompt.rsplit("User question:", 1)
+    record = head.split("Forecast record:", 1)[1].strip() if "Forecast record:" in head else None
+    match = RE_RUN_ID.search(record or "")
+    return {"record": record, "question": question.strip(), "run_id": match.group(1) if match else None}
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    if len(text) <= limit:
+        return text
+    return text[: limit - 1].rstrip() + "…"
+
+
+def _first_sentence(text: str) -> str:
+    # Skip markdown emphasis so "**Light** rain" digests as "Light rain"
+    plain = (text or "").replace("**", "").replace("_", "")
+    return RE_SENTENCE_END.split(plain.strip(), 1)[0]
+
+
+class BoundedChat:
+    """
+    Chat session whose request size does not grow with the conversation.
+
+    Each send starts a fresh model chat seeded with: a digest of older turns
+    (one line per question, capped at MAX_SUMMARY_CHARS), then the last
+    VERBATIM_TURNS questions and answers. Forecast records are kept only on
+    turns from the run the new prompt uses; records from superseded runs are
+    dropped since their numbers no longer apply. The standing instructions
+    are sent with the new prompt only, never repeated in the history.
+
+    Turns are added with add_turn once the user has seen the answer, so the
+    history matches what was shown (cached answers and templated fallbacks
+    included) rather than whatever the model returned last.
+    """
+
+    def __init__(self, model: Any, verbatim_turns: int = VERBATIM_TURNS, max_summary_chars: int = MAX_SUMMARY_CHARS):
+        self.model = model
+        self.verbatim_turns = max(0, int(verbatim_turns))
+        self.max_summary_chars = max_summary_chars
+        self.turns: List[Dict[str, Optional[str]]] = []
+        self.digest: List[str] = []
+
+    def add_turn(self, prompt: str, answer: str) -> None:
+        parts = split_prompt(prompt)
+        self.turns.append(
+            {
+                "question": _clip(parts["question"], MAX_TURN_CHARS),
+                "record": parts["record"],
+                "run_id": parts["run_id"],
+                "answer": (answer or "")[:MAX_TURN_CHARS],
+            }
+        )
+        while len(self.turns) > self.verbatim_turns:
+            self._fold(self.turns.pop(0))
+
+    def _fold(self, turn: Dict[str, Optional[str]]) -> None:
+        self.digest.append(
+            f"- Q: {_clip(turn['question'], DIGEST_QUESTION_CHARS)}"
+            f" A: {_clip(_first_sentence(turn['answer']), DIGEST_ANSWER_CHARS)}"
+        )
+        while self.digest and sum(len(line) + 1 for line in self.digest) > self.max_summary_chars:
+            self.digest.pop(0)
+
+    def history(self, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Model history for a prompt about run_id, in Gemini's content format."""
+        history: List[Dict[str, Any]] = []
+        if self.digest:
+            history.append(
+                {"role": "user", "parts": ["Summary of our earlier conversation:\n" + "\n".join(self.digest)]}
+            )
+            history.append({"role": "model", "parts": ["Noted."]})
+        for turn in self.turns:
+            text = turn["question"]
+            if turn["record"] and run_id and turn["run_id"] == run_id:
+                text = f"Forecast record:\n{turn['record']}\nUser question: {text}"
+            history.append({"role": "user", "parts": [text]})
+            history.append({"role": "model", "parts": [turn["answer"] or "…"]})
+        return history
+
+    def send_message(self, prompt: str, stream: bool = False):
+        chat = self.model.start_chat(history=self.history(split_prompt(prompt)["run_id"]))
+        return chat.send_message(prompt, stream=stream)
+
+    def standalone(self) -> "BoundedChat":
+        """A chat on the same model with no history, for answers shared across sessions."""
+        return BoundedChat(self.model, verbatim_turns=0, max_summary_chars=0)
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.digest.clear()
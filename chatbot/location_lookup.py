@@ -1,6 +1,12 @@
+import bisect
+import heapq
 import re
 from difflib import SequenceMatcher
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from chatbot.cache import TTLCache
 
 
 STOPWORDS = {
@@ -22,6 +28,36 @@ STOPWORDS = {
     "is",
 }
 
+# Query tokens shorter than this only match exactly
+MIN_PARTIAL_TOKEN = 3
+MIN_FUZZY_TOKEN = 4
+# Share of a query token's trigrams a vocabulary token must contain
+TRIGRAM_THRESHOLD = 0.6
+# Tokens naming more locations than this ("county", a state name) add to the
+# score of candidates but do not generate candidates on their own
+MAX_POSTING_SCAN = 2000
+# Closest partial/typo vocabulary matches kept per query token
+MAX_TOKEN_EXPANSIONS = 8
+MAX_CACHED_INDEXES = 4
+# SequenceMatcher starts junking frequent characters of texts this long
+AUTOJUNK_MIN_LENGTH = 200
+# Candidates whose score bound is tightened at a time, from text lengths to
+# shared character counts, and from those to a longest common subsequence
+QUICK_BLOCK = 32
+LCS_BLOCK = 32
+# Blocks double each time they are refined, up to this many candidates
+MAX_BLOCK = 512
+# Longest query the bit-parallel LCS bound handles (one uint64 per text)
+MAX_LCS_QUERY = 64
+# Characters of normalized text; anything else is counted in one extra bin
+CHARSET = "abcdefghijklmnopqrstuvwxyz0123456789 "
+_CHAR_CODES = np.full(256, len(CHARSET), dtype=np.int64)
+_CHAR_CODES[np.frombuffer(CHARSET.encode("ascii"), dtype=np.uint8)] = np.arange(len(CHARSET))
+# Code past the end of a text; matches no query character
+_PAD_CODE = len(CHARSET) + 1
+
+_INDEX_CACHE = TTLCache("location_indexes", max_entries=MAX_CACHED_INDEXES)
+
 
 def normalize_place_name(name: str) -> str:
     """
@@ -43,7 +79,8 @@ def _strip_time_phrases(text: str) -> str:
     return TIME_RE.sub(" ", text)
 
 
-def _normalize_text(text: str) -> str:
+def normalize_text(text: str) -> str:
+    """Lowercase text with punctuation removed and whitespace collapsed, as places are matched."""
     lowered = text.lower()
     lowered = re.sub(r"[^a-z0-9\s]", " ", lowered)
     lowered = re.sub(r"\s+", " ", lowered)
@@ -59,61 +96,567 @@ def _score_match(query_tokens: List[str], query_text: str, loc_text: str) -> flo
         return 0.0
     loc_tokens = set(_tokenize(loc_text))
     overlap = len(loc_tokens & set(query_tokens))
-    ratio = SequenceMatcher(None, query_text, loc_text).ratio()
+    if len(loc_text) < AUTOJUNK_MIN_LENGTH and (loc_text in query_text or query_text in loc_text):
+        # SequenceMatcher matches the shorter text whole and nothing else
+        ratio = 2.0 * min(len(query_text), len(loc_text)) / (len(query_text) + len(loc_text))
+    else:
+        ratio = SequenceMatcher(None, query_text, loc_text).ratio()
     substring_bonus = 0.5 if any(tok in loc_text for tok in query_tokens) else 0.0
     return overlap * 1.5 + ratio + substring_bonus
 
 
-def rank_locations(
-    query: str,
-    locations: List[Dict[str, Any]],
-    limit: int = 5,
-    min_score: float = 0.5,
-) -> List[Tuple[float, Dict[str, Any]]]:
+def _location_fields(loc: Dict[str, Any]) -> Tuple[str, str, str]:
+    place_text = normalize_text(loc.get("place", ""))
+    slug_text = normalize_text(loc.get("normalized_place", "").replace("-", " "))
+    primary_text = normalize_text((loc.get("place") or "").split(",")[0])
+    return place_text, slug_text, primary_text
+
+
+def _location_bonus(query_tokens: List[str], normalized_query: str, primary_text: str) -> float:
+    bonus = 0.0
+    if primary_text and primary_text in normalized_query:
+        bonus += 2.0
+
+    if primary_text and any(tok in primary_text.split() for tok in query_tokens):
+        bonus += 0.5
+    return bonus
+
+
+def _match_ceiling(query_tokens: List[str], query_text: str, loc_text: str) -> float:
+    """_score_match with the ratio replaced by its length-only ceiling (real_quick_ratio)."""
+    if not loc_text:
+        return 0.0
+    overlap = len(set(_tokenize(loc_text)) & set(query_tokens))
+    ratio = 2.0 * min(len(query_text), len(loc_text)) / (len(query_text) + len(loc_text))
+    substring_bonus = 0.5 if any(tok in loc_text for tok in query_tokens) else 0.0
+    return overlap * 1.5 + ratio + substring_bonus
+
+
+def _score_location(
+    query_tokens: List[str],
+    normalized_query: str,
+    fields: Tuple[str, str, str],
+    matches: Optional[Dict[str, float]] = None,
+) -> float:
     """
-    Rank manifest locations against a free-form query.
-    Returns up to `limit` entries sorted by score desc.
+    Best _score_match over place, slug and primary name plus the primary-name
+    bonuses. Fields whose ceiling cannot beat the best score so far are not
+    run through SequenceMatcher. `matches` memoizes _score_match per text
+    for one query; many places share a primary name.
     """
-    stripped = _strip_time_phrases(query)
-    normalized_query = _normalize_text(stripped)
-    if not normalized_query:
-        return []
+    if matches is None:
+        matches = {}
+    ceilings = sorted(
+        ((_match_ceiling(query_tokens, normalized_query, text), text) for text in set(fields)),
+        reverse=True,
+    )
+    score = 0.0
+    for ceiling, loc_text in ceilings:
+        if ceiling <= score:
+            break
+        match = matches.get(loc_text)
+        if match is None:
+            match = matches[loc_text] = _score_match(query_tokens, normalized_query, loc_text)
+        score = max(score, match)
+    return score + _location_bonus(query_tokens, normalized_query, fields[2])
 
+
+def query_terms(query: str) -> Tuple[str, List[str]]:
+    """
+    (normalized query, tokens scored against locations) for a free-form
+    question: time phrases and stopwords are dropped, unless only
+    stopwords are left.
+    """
+    normalized_query = normalize_text(_strip_time_phrases(query))
     query_tokens = [tok for tok in _tokenize(normalized_query) if tok not in STOPWORDS]
     if not query_tokens:
         query_tokens = _tokenize(normalized_query)
+    return normalized_query, query_tokens
 
-    query_slug = normalize_place_name(normalized_query)
 
+def _rank_linear(
+    query: str,
+    locations: Sequence[Dict[str, Any]],
+    limit: int,
+    min_score: float,
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """Score every location; for one-off lists where building an index costs more."""
+    normalized_query, query_tokens = query_terms(query)
+    if not normalized_query:
+        return []
+
+    query_slug = normalize_place_name(normalized_query)
     scored: List[Tuple[float, Dict[str, Any]]] = []
+    matches: Dict[str, float] = {}
     for loc in locations:
-        place_text = _normalize_text(loc.get("place", ""))
-        slug_text = _normalize_text(loc.get("normalized_place", "").replace("-", " "))
-        primary_text = _normalize_text((loc.get("place") or "").split(",")[0])
-
         # Exact slug match wins immediately
         if loc.get("normalized_place") == query_slug:
             return [(1e6, loc)]
+        score = _score_location(query_tokens, normalized_query, _location_fields(loc), matches)
+        if score >= min_score:
+            scored.append((score, loc))
 
-        score_place = _score_match(query_tokens, normalized_query, place_text)
-        score_slug = _score_match(query_tokens, normalized_query, slug_text)
-        score_primary = _score_match(query_tokens, normalized_query, primary_text)
+    scored.sort(key=lambda x: (-x[0], x[1].get("place", "")))
+    return scored[:limit]
 
-        score = max(score_place, score_slug, score_primary)
 
-        if primary_text and primary_text in normalized_query:
-            score += 2.0
+def _trigrams(token: str) -> Set[str]:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
 
-        if primary_text and any(tok in primary_text.split() for tok in query_tokens):
-            score += 0.5
 
-        if score >= min_score:
-            scored.append((score, loc))
+def _deletes(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
 
-    scored.sort(key=lambda x: (-x[0], x[1].get("place", "")))
-    return scored[:limit]
 
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, returning limit + 1 as soon as it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _char_counts(texts: Sequence[str]) -> np.ndarray:
+    """Per-text character histograms over CHARSET, shape (len(texts), len(CHARSET) + 1)."""
+    width = len(CHARSET) + 1
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = _CHAR_CODES[np.frombuffer("".join(texts).encode("ascii", "replace"), dtype=np.uint8)]
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    counts = np.bincount(rows * width + codes, minlength=len(texts) * width).reshape(len(texts), width)
+    return np.minimum(counts, 255).astype(np.uint8)
+
+
+def _query_masks(normalized_query: str) -> np.ndarray:
+    """Bit i of entry c is set when character code c is at position i of the query."""
+    masks = np.zeros(_PAD_CODE + 1, dtype=np.uint64)
+    for position, code in enumerate(_CHAR_CODES[np.frombuffer(normalized_query.encode("ascii", "replace"), dtype=np.uint8)]):
+        masks[code] |= np.uint64(1 << position)
+    return masks
+
+
+class _Postings:
+    """Token -> location ids, also stored flat so unions over many tokens stay vectorized."""
+
+    def __init__(self, postings: Dict[str, List[int]]):
+        self.lists = postings
+        self.ids = {tok: i for i, tok in enumerate(postings)}
+        sizes = np.fromiter((len(ids) for ids in postings.values()), dtype=np.int64, count=len(postings))
+        self.ends = np.cumsum(sizes)
+        self.starts = self.ends - sizes
+        self.flat = np.fromiter(
+            (idx for ids in postings.values() for idx in ids), dtype=np.int32, count=int(sizes.sum())
+        )
+
+    def __len__(self) -> int:
+        return len(self.lists)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self.lists
+
+    def get(self, token: str) -> np.ndarray:
+        i = self.ids.get(token)
+        return self.flat[self.starts[i]:self.ends[i]] if i is not None else self.flat[:0]
 
-def best_location_match(query: str, locations: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    def union(self, tokens: Iterable[str]) -> np.ndarray:
+        """Location ids of any of tokens; an id may repeat."""
+        picked = np.fromiter((self.ids[tok] for tok in tokens if tok in self.ids), dtype=np.int64)
+        if not len(picked):
+            return self.flat[:0]
+        sizes = self.ends[picked] - self.starts[picked]
+        offsets = np.repeat(self.starts[picked] - (np.cumsum(sizes) - sizes), sizes)
+        return self.flat[offsets + np.arange(int(sizes.sum()))]
+
+
+class LocationIndex:
+    """
+    Search index over one run's manifest locations, built once and reused for
+    every query, returning what rank_locations' full scan would.
+
+    Outside a few bonuses a location's score is its SequenceMatcher ratio
+    (at most 1), so the candidates are the places that can earn one: those
+    sharing a token with the query, holding a query token inside a longer
+    word ("wlin" in "ckwlins"), or whose primary name appears in the query.
+    Each gets an upper bound from its token overlap, its bonuses and the
+    character-count ceiling of the ratio (SequenceMatcher.quick_ratio,
+    vectorized over precomputed histograms) tightened by the longest common
+    subsequence where needed, and candidates are scored best
+    bound first until none left can reach the top `limit`. Places sharing
+    only a very common token ("lake", a state name) join in the same way
+    when those candidates leave room in the top `limit`, along with places
+    holding the closest vocabulary tokens to an unknown query token
+    (trigram and one-edit deletion indexes). If the top `limit` still has
+    room for a score of 1 or less, every other place is ranked too. See
+    chatbot/bench_location_lookup.py for a comparison with the full scan.
+    """
+
+    def __init__(self, locations: Sequence[Dict[str, Any]]):
+        self.locations = list(locations)
+        self.fields: List[Tuple[str, str, str]] = []
+        self.by_slug: Dict[str, int] = {}
+        self.by_primary: Dict[str, List[int]] = {}
+        # Position of each location dict, for callers holding rank_locations output
+        self.positions: Dict[int, int] = {id(loc): idx for idx, loc in enumerate(self.locations)}
+        texts: Dict[str, int] = {"": 0}
+        text_ids: List[Tuple[int, int, int]] = []
+        postings: Dict[str, List[int]] = {}
+        primary_postings: Dict[str, List[int]] = {}
+        for idx, loc in enumerate(self.locations):
+            fields = _location_fields(loc)
+            self.fields.append(fields)
+            text_ids.append(tuple(texts.setdefault(text, len(texts)) for text in fields))
+            slug = loc.get("normalized_place")
+            if slug and slug not in self.by_slug:
+                self.by_slug[slug] = idx
+            for tok in set(_tokenize(" ".join(fields))):
+                postings.setdefault(tok, []).append(idx)
+            for tok in set(_tokenize(fields[2])):
+                primary_postings.setdefault(tok, []).append(idx)
+            if fields[2]:
+                self.by_primary.setdefault(fields[2], []).append(idx)
+        self.postings = _Postings(postings)
+        self.primary_postings = _Postings(primary_postings)
+        self.primary_lengths = sorted({len(text) for text in self.by_primary})
+
+        # Distinct field texts: place and slug usually coincide and primary
+        # names repeat, so histograms are kept per text, not per field
+        text_list = list(texts)
+        self.text_ids = np.array(text_ids, dtype=np.int32).reshape(len(self.locations), 3)
+        sizes = np.fromiter((len(text) for text in text_list), dtype=np.int64, count=len(text_list))
+        self.text_lengths = sizes.astype(np.float64)
+        self.text_chars = _char_counts(text_list)
+        self.text_codes = _CHAR_CODES[np.frombuffer("".join(text_list).encode("ascii", "replace"), dtype=np.uint8)]
+        self.text_starts = np.cumsum(sizes) - sizes
+
+        self.token_trigrams: Dict[str, Set[str]] = {}
+        self.trigram_vocab: Dict[str, List[str]] = {}
+        self.bigram_vocab: Dict[str, List[str]] = {}
+        self.delete_vocab: Dict[str, List[str]] = {}
+        for tok in postings:
+            grams = _trigrams(tok)
+            self.token_trigrams[tok] = grams
+            for gram in grams:
+                self.trigram_vocab.setdefault(gram, []).append(tok)
+            for gram in {tok[i:i + 2] for i in range(len(tok) - 1)}:
+                self.bigram_vocab.setdefault(gram, []).append(tok)
+            if len(tok) >= MIN_FUZZY_TOKEN:
+                for variant in _deletes(tok):
+                    self.delete_vocab.setdefault(variant, []).append(tok)
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def _partial_tokens(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens sharing most of token's trigrams, with their Dice weight."""
+        grams = _trigrams(token)
+        needed = max(1, int(len(grams) * TRIGRAM_THRESHOLD + 0.999))
+        # Pigeonhole: a match holding `needed` grams has one of the rarest
+        # len(grams) - needed + 1 of them, so only those postings are read
+        ordered = sorted(grams, key=lambda gram: len(self.trigram_vocab.get(gram, ())))
+        seeds: Set[str] = set()
+        for gram in ordered[: len(grams) - needed + 1]:
+            seeds.update(self.trigram_vocab.get(gram, ()))
+        matches: Dict[str, float] = {}
+        for tok in seeds:
+            shared = len(grams & self.token_trigrams[tok])
+            if shared >= needed:
+                matches[tok] = 2.0 * shared / (len(grams) + len(self.token_trigrams[tok]))
+        return matches
+
+    def _fuzzy_tokens(self, token: str) -> Dict[str, float]:
+        """Vocabulary tokens within the typo budget of token."""
+        limit = 1 if len(token) <= 5 else 2
+        seeds: Set[str] = set(self.delete_vocab.get(token, ()))
+        for variant in _deletes(token) | {token}:
+            if variant in self.postings:
+                seeds.add(variant)
+            seeds.update(self.delete_vocab.get(variant, ()))
+        matches: Dict[str, float] = {}
+        for tok in seeds:
+            distance = _edit_distance(token, tok, limit)
+            if distance <= limit:
+                matches[tok] = 1.0 - distance / max(len(token), len(tok))
+        return matches
+
+    def _similar_tokens(self, token: str) -> List[str]:
+        """
+        Closest partial or typo matches for a token the vocabulary lacks.
+        They earn no bonus, so they only matter when few places do.
+        """
+        similar: Dict[str, float] = {}
+        if len(token) >= MIN_PARTIAL_TOKEN:
+            similar = self._partial_tokens(token)
+            # Vocabulary words inside the token ("cheyennewy" holds "cheyenne")
+            for size in range(MIN_PARTIAL_TOKEN, len(token)):
+                for start in range(len(token) - size + 1):
+                    piece = token[start:start + size]
+                    if piece in self.postings:
+                        similar[piece] = max(similar.get(piece, 0.0), size / len(token))
+        if len(token) >= MIN_FUZZY_TOKEN and not similar:
+            similar = self._fuzzy_tokens(token)
+        return heapq.nlargest(MAX_TOKEN_EXPANSIONS, similar, key=similar.__getitem__)
+
+    def _containing_tokens(self, token: str) -> Optional[List[str]]:
+        """
+        Vocabulary tokens holding token, itself included: the places earning
+        rank_locations' substring bonus. None for one-letter tokens, which
+        are matched against each text's character counts instead.
+        """
+        if len(token) < 2:
+            return None
+        if len(token) == 2:
+            return self.bigram_vocab.get(token, [])
+        inner = [token[i:i + 3] for i in range(len(token) - 2)]
+        rarest = min(inner, key=lambda gram: len(self.trigram_vocab.get(gram, ())))
+        return [tok for tok in self.trigram_vocab.get(rarest, ()) if token in tok]
+
+    def _primary_hits(self, normalized_query: str) -> List[int]:
+        """Locations whose primary name is a substring of the query ("ralington" in "aieralington")."""
+        hits: List[int] = []
+        query_len = len(normalized_query)
+        for size in self.primary_lengths:
+            if size > query_len:
+                break
+            for start in range(query_len - size + 1):
+                hits.extend(self.by_primary.get(normalized_query[start:start + size], ()))
+        return hits
+
+    def _ratio_bounds(self, ids: np.ndarray, normalized_query: str, query_chars: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Ceiling of the best field ratio for each location in ids: from the
+        text lengths alone (real_quick_ratio), or from shared character
+        counts (quick_ratio) when query_chars is given.
+        """
+        text_ids = self.text_ids[ids]
+        lengths = self.text_lengths[text_ids]
+        query_len = float(len(normalized_query))
+        if query_chars is None:
+            shared = np.minimum(lengths, query_len)
+        else:
+            shared = np.minimum(self.text_chars[text_ids], query_chars).sum(axis=2, dtype=np.float64)
+        return (2.0 * shared / (query_len + lengths)).max(axis=1)
+
+    def _lcs_bounds(self, ids: np.ndarray, normalized_query: str, query_masks: np.ndarray) -> np.ndarray:
+        """
+        Ceiling of the best field ratio for each location in ids from the
+        longest common subsequence with the query, which SequenceMatcher's
+        matching blocks can never exceed. Computed bit-parallel (Hyyro),
+        one character column at a time for every text in the batch.
+        """
+        text_ids = self.text_ids[ids]
+        unique, inverse = np.unique(text_ids.ravel(), return_inverse=True)
+        sizes = self.text_lengths[unique].astype(np.int64)
+        steps = np.arange(int(sizes.max()) if len(sizes) else 0)
+        positions = np.minimum(self.text_starts[unique][:, None] + steps, len(self.text_codes) - 1)
+        codes = np.where(steps < sizes[:, None], self.text_codes[positions], _PAD_CODE)
+        bits = np.full(len(unique), np.iinfo(np.uint64).max, dtype=np.uint64)
+        for column in codes.T:
+            matched = bits & query_masks[column]
+            bits = (bits + matched) | (bits - matched)
+        query_bits = np.uint64((1 << len(normalized_query)) - 1)
+        common = np.unpackbits((~bits & query_bits).view(np.uint8)).reshape(-1, 64).sum(axis=1)
+        ratios = 2.0 * common / (len(normalized_query) + sizes)
+        return ratios[inverse].reshape(text_ids.shape).max(axis=1)
+
+    def search(
+        self,
+        normalized_query: str,
+        query_tokens: List[str],
+        limit: int,
+        min_score: float,
+    ) -> List[Tuple[float, int]]:
+        """(score, location id) of the best `limit` locations, best first."""
+        size = len(self.locations)
+        unique = list(dict.fromkeys(query_tokens))
+        overlap = np.zeros(size, dtype=np.float64)
+        substring = np.zeros(size, dtype=bool)
+        in_primary = np.zeros(size, dtype=bool)
+        seeds = np.zeros(size, dtype=bool)
+        common: List[str] = []
+        for tok in unique:
+            if tok in self.postings:
+                ids = self.postings.get(tok)
+                overlap[ids] += 1.0
+                in_primary[self.primary_postings.get(tok)] = True
+                if len(ids) <= MAX_POSTING_SCAN:
+                    seeds[ids] = True
+                else:
+                    # Adds to the score of candidates, but does not make one
+                    common.append(tok)
+            containing = self._containing_tokens(tok)
+            if containing is None:
+                # One letter: any field holding it, from the character counts
+                held = self.text_chars[:, _CHAR_CODES[ord(tok)]] > 0
+                substring |= held[self.text_ids].any(axis=1)
+            else:
+                substring[self.postings.get(tok)] = True
+                ids = self.postings.union(word for word in containing if word != tok)
+                substring[ids] = True
+                seeds[ids] = True
+        primary = np.zeros(size, dtype=bool)
+        primary[self._primary_hits(normalized_query)] = True
+        seeds |= primary
+        if not seeds.any() and common:
+            # Only very common tokens matched: seed from the rarest of them
+            seeds[self.postings.get(min(common, key=lambda tok: len(self.postings.lists[tok])))] = True
+        bonuses = overlap * 1.5 + substring * 0.5 + primary * 2.0 + in_primary * 0.5
+
+        search = _Search(self, normalized_query, query_tokens, limit, min_score)
+        search.run(np.flatnonzero(seeds), bonuses)
+        if not search.settled(float(bonuses[~seeds].max(initial=0.0)) + 1.0):
+            # Everything else scores at most the common tokens' bonus plus 1:
+            # when the seeds fall short of that, rank the common tokens'
+            # places and those resembling an unknown token too
+            rest = bonuses > 0
+            for tok in unique:
+                if tok not in self.postings:
+                    rest[self.postings.union(self._similar_tokens(tok))] = True
+            search.run(np.flatnonzero(rest & ~seeds), bonuses)
+            if not search.settled(1.0):
+                # Room left for places earning no bonus: rank the rest too
+                search.run(np.flatnonzero(~(rest | seeds)), bonuses)
+        search.scored.sort(key=lambda x: (-x[0], self.locations[x[1]].get("place", "")))
+        return search.scored[:limit]
+
+
+class _Search:
+    """
+    Best-first scoring for one LocationIndex.search call. Candidates carry
+    three bounds of increasing cost and tightness: text lengths, shared
+    character counts, longest common subsequence. Whichever candidate has
+    the highest bound is either scored (tightest bound) or has its block's
+    bound tightened, until nothing left can reach the top `limit`.
+    """
+
+    def __init__(self, index: LocationIndex, normalized_query: str, query_tokens: List[str], limit: int, min_score: float):
+        self.index = index
+        self.normalized_query = normalized_query
+        self.query_tokens = query_tokens
+        self.limit = limit
+        self.min_score = min_score
+        self.query_chars = _char_counts([normalized_query])[0]
+        self.query_masks = _query_masks(normalized_query) if len(normalized_query) <= MAX_LCS_QUERY else None
+        self.matches: Dict[str, float] = {}
+        self.scored: List[Tuple[float, int]] = []
+        # Best `limit` so far as (-score, place), in rank_locations' order
+        self.top: List[Tuple[float, str]] = []
+
+    def _floor(self) -> float:
+        """Lowest bound that can still reach the top `limit`."""
+        if len(self.top) >= self.limit:
+            return max(self.min_score, -self.top[-1][0])
+        return self.min_score
+
+    def _beaten(self, bound: float) -> bool:
+        return bound < self._floor()
+
+    def settled(self, ceiling: float) -> bool:
+        """True when the top `limit` all score above ceiling."""
+        return len(self.top) >= self.limit and -self.top[-1][0] > ceiling
+
+    def _score(self, idx: int, bound: float) -> None:
+        place = self.index.locations[idx].get("place", "")
+        if len(self.top) >= self.limit and bound - 2e-9 < -self.top[-1][0] and place >= self.top[-1][1]:
+            # At best a tie with the last place kept, which sorts first by name
+            return
+        score = _score_location(self.query_tokens, self.normalized_query, self.index.fields[idx], self.matches)
+        if score < self.min_score:
+            return
+        self.scored.append((score, idx))
+        bisect.insort(self.top, (-score, place))
+        del self.top[self.limit:]
+
+    def run(self, candidates: np.ndarray, bonuses: np.ndarray) -> None:
+        if not len(candidates):
+            return
+        index, query = self.index, self.normalized_query
+        rest = bonuses[candidates]
+        # Slack for float rounding between the bounds and the exact scores
+        coarse = rest + index._ratio_bounds(candidates, query, None) + 1e-9
+        order = np.argsort(-coarse, kind="stable")
+        # Heaps of (-bound, candidate slot)
+        quick: List[Tuple[float, int]] = []
+        tight: List[Tuple[float, int]] = []
+        position = 0
+        quick_block, lcs_block = QUICK_BLOCK, LCS_BLOCK
+        while True:
+            next_coarse = coarse[order[position]] if position < len(order) else -1.0
+            best_quick = -quick[0][0] if quick else -1.0
+            best_tight = -tight[0][0] if tight else -1.0
+            best = max(next_coarse, best_quick, best_tight)
+            if self._beaten(best):
+                return
+            if best_tight >= best:
+                bound, slot = heapq.heappop(tight)
+                self._score(int(candidates[slot]), -bound)
+            elif best_quick >= next_coarse:
+                block = np.array([heapq.heappop(quick)[1] for _ in range(min(lcs_block, len(quick)))])
+                lcs_block = min(lcs_block * 2, MAX_BLOCK)
+                bounds = rest[block] + index._lcs_bounds(candidates[block], query, self.query_masks) + 1e-9
+                self._push(tight, bounds, block)
+            else:
+                block = order[position:position + quick_block]
+                position += len(block)
+                quick_block = min(quick_block * 2, MAX_BLOCK)
+                bounds = rest[block] + index._ratio_bounds(candidates[block], query, self.query_chars) + 1e-9
+                # Without an LCS bound the character-count one is final
+                self._push(quick if self.query_masks is not None else tight, bounds, block)
+
+    def _push(self, heap: List[Tuple[float, int]], bounds: np.ndarray, block: np.ndarray) -> None:
+        keep = bounds >= self._floor()
+        for bound, slot in zip(bounds[keep].tolist(), block[keep].tolist()):
+            heapq.heappush(heap, (-bound, slot))
+
+
+def location_index_for_run(run_id: str, locations: Sequence[Dict[str, Any]]) -> LocationIndex:
+    """
+    Shared LocationIndex for a run. Built once per process; concurrent
+    sessions asking for the same run wait for a single build.
+    """
+    return _INDEX_CACHE.get_or_load(run_id, lambda: LocationIndex(locations))
+
+
+def rank_locations(
+    query: str,
+    locations: Union[LocationIndex, List[Dict[str, Any]]],
+    limit: int = 5,
+    min_score: float = 0.5,
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    Rank manifest locations against a free-form query.
+    Returns up to `limit` entries sorted by score desc.
+    Pass a prebuilt LocationIndex (see location_index_for_run) on hot paths;
+    a plain list is scanned in full.
+    """
+    if not isinstance(locations, LocationIndex):
+        return _rank_linear(query, locations, limit, min_score)
+
+    index = locations
+    normalized_query, query_tokens = query_terms(query)
+    if not normalized_query:
+        return []
+
+    # Exact slug match wins immediately
+    query_slug = normalize_place_name(normalized_query)
+    if query_slug in index.by_slug:
+        return [(1e6, index.locations[index.by_slug[query_slug]])]
+
+    return [
+        (score, index.locations[idx])
+        for score, idx in index.search(normalized_query, query_tokens, limit, min_score)
+    ]
+
+
+def best_location_match(
+    query: str,
+    locations: Union[LocationIndex, List[Dict[str, Any]]],
+) -> Optional[Dict[str, Any]]:
     ranked = rank_locations(query, locations, limit=1)
     return ranked[0][1] if ranked else None
@@ -0,0 +1,134 @@
+# chatbot/location_spatial.py
+import math
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from chatbot.cache import TTLCache
+
+EARTH_RADIUS_KM = 6371.0088
+MAX_CACHED_INDEXES = 4
+# Nearest location further than this from a point is not a match
+MAX_MATCH_DISTANCE_KM = 50.0
+
+_SPATIAL_CACHE = TTLCache("location_spatial", max_entries=MAX_CACHED_INDEXES)
+
+# "41.15, -104.81", "41.15 -104.81", "41.15N 104.81W"
+RE_COORDS = re.compile(
+    r"(?P<lat>[-+]?\d{1,2}(?:\.\d+)?)\s*°?\s*(?P<lat_hemi>[NS])?\s*[,;/\s]\s*"
+    r"(?P<lon>[-+]?\d{1,3}(?:\.\d+)?)\s*°?\s*(?P<lon_hemi>[EW])?\b",
+    re.I,
+)
+RE_NEAR_ME = re.compile(
+    r"\b(?:near\s+me|nearby|around\s+me|around\s+here|my\s+(?:location|area|place)|where\s+i\s+am|the\s+pin|my\s+pin|(?:the|my)\s+marker)\b",
+    re.I,
+)
+
+
+def extract_coordinates(text: str) -> Optional[Tuple[float, float]]:
+    """
+    Parse a latitude/longitude pair such as '41.15, -104.81' or
+    '41.15N 104.81W'. Requires a decimal point or a hemisphere letter so
+    phrases like 'in 5 10' are not read as coordinates.
+    """
+    for m in RE_COORDS.finditer(text):
+        lat_s, lon_s = m.group("lat"), m.group("lon")
+        lat_hemi, lon_hemi = m.group("lat_hemi"), m.group("lon_hemi")
+        if not (("." in lat_s and "." in lon_s) or (lat_hemi and lon_hemi)):
+            continue
+        lat, lon = float(lat_s), float(lon_s)
+        if lat_hemi and lat_hemi.upper() == "S":
+            lat = -abs(lat)
+        if lon_hemi and lon_hemi.upper() == "W":
+            lon = -abs(lon)
+        if -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0:
+            return lat, lon
+    return None
+
+
+def mentions_current_location(text: str) -> bool:
+    """True for 'near me', 'my location', 'at the pin' style questions."""
+    return bool(RE_NEAR_ME.search(text))
+
+
+def _to_unit_xyz(lat, lon) -> np.ndarray:
+    lat_r = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_r = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat_r)
+    return np.stack((cos_lat * np.cos(lon_r), cos_lat * np.sin(lon_r), np.sin(lat_r)), axis=-1)
+
+
+def _chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2.0 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2.0)
+
+
+class LocationSpatialIndex:
+    """
+    KD-tree over manifest locations projected onto the unit sphere, so
+    Euclidean chord length orders points exactly like great-circle distance
+    and needs no haversine scan. Locations without coordinates are skipped.
+    """
+
+    def __init__(self, locations: Sequence[Dict[str, Any]]):
+        self.locations: List[Dict[str, Any]] = []
+        lats, lons = [], []
+        for loc in locations:
+            try:
+                lat, lon = float(loc.get("latitude")), float(loc.get("longitude"))
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(lat) and math.isfinite(lon):
+                self.locations.append(loc)
+                lats.append(lat)
+                lons.append(lon)
+        self.tree = cKDTree(_to_unit_xyz(lats, lons)) if self.locations else None
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Tuple[float, Dict[str, Any]]]:
+        """Up to k (distance_km, location) pairs, closest first."""
+        if self.tree is None:
+            return []
+        k = min(k, len(self.locations))
+        chords, ids = self.tree.query(_to_unit_xyz(lat, lon), k=k)
+        chords, ids = np.atleast_1d(chords), np.atleast_1d(ids)
+        return [(float(d), self.locations[int(i)]) for d, i in zip(_chord_to_km(chords), ids)]
+
+    def within(self, lat: float, lon: float, radius_km: float) -> List[Tuple[float, Dict[str, Any]]]:
+        """All (distance_km, location) pairs within radius_km, closest first."""
+        if self.tree is None:
+            return []
+        point = _to_unit_xyz(lat, lon)
+        ids = self.tree.query_ball_point(point, _km_to_chord(radius_km))
+        if not ids:
+            return []
+        chords = np.linalg.norm(self.tree.data[ids] - point, axis=1)
+        order = np.argsort(chords)
+        distances = _chord_to_km(chords[order])
+        return [(float(d), self.locations[ids[i]]) for d, i in zip(distances, order)]
+
+
+def spatial_index_for_run(run_id: str, locations: Sequence[Dict[str, Any]]) -> LocationSpatialIndex:
+    """Shared LocationSpatialIndex for a run, built once per process."""
+    return _SPATIAL_CACHE.get_or_load(run_id, lambda: LocationSpatialIndex(locations))
+
+
+def nearest_location(
+    run_id: str,
+    locations: Sequence[Dict[str, Any]],
+    lat: float,
+    lon: float,
+    max_distance_km: float = MAX_MATCH_DISTANCE_KM,
+) -> Optional[Tuple[float, Dict[str, Any]]]:
+    """(distance_km, location) of the forecast location nearest to a point, or None if none is close enough."""
+    hits = spatial_index_for_run(run_id, locations).nearest(lat, lon, k=1)
+    if not hits or hits[0][0] > max_distance_km:
+        return None
+    return hits[0]
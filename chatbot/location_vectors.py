@@ -0,0 +1,310 @@
+# chatbot/location_vectors.py
+import hashlib
+import json
+import os
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from chatbot.cache import TTLCache
+from chatbot.location_lookup import (
+    location_index_for_run,
+    normalize_place_name,
+    normalize_text,
+    query_terms,
+    rank_locations,
+)
+
+try:
+    import faiss
+except ImportError:  # pragma: no cover - optional dependency
+    faiss = None
+
+# Local sentence-transformers model used to embed place names. The hosted
+# EMBEDDING_MODEL in bot_setup needs one API call per place, so it is not
+# used here. It is only loaded from the local Hugging Face cache, never
+# downloaded by the app; without it the n-gram encoder is used. Set
+# LOCATION_EMBEDDING_MODEL="" to force the n-gram encoder.
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCATION_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+VECTOR_DIR = Path(os.getenv("LOCATION_VECTOR_DIR", Path.home() / ".cache" / "rainloop" / "location_vectors"))
+
+NGRAM_DIM = 384
+NGRAM_SIZES = (2, 3, 4)
+# Above this many places the FAISS index is HNSW instead of exact search
+FLAT_INDEX_MAX = 20000
+HNSW_NEIGHBORS = 32
+HNSW_EF_SEARCH = 64
+VECTOR_CANDIDATES = 20
+# Cosine similarity a place lexical ranking did not find needs on its own, so
+# questions naming no place ("is it raining?") fall through to the previous
+# place or the map pin instead of a loosely similar name
+MIN_SIMILARITY = 0.75
+# Weight of the cosine similarity next to rank_locations scores (0..~10)
+VECTOR_WEIGHT = 2.0
+MAX_CACHED_INDEXES = 4
+
+_VECTOR_CACHE = TTLCache("location_vectors", max_entries=MAX_CACHED_INDEXES)
+_BUILDING: Dict[str, threading.Thread] = {}
+_BUILD_LOCK = threading.Lock()
+_ENCODERS: Dict[str, Any] = {}
+_ENCODER_LOCK = threading.Lock()
+
+
+# ---------------- Encoders ----------------
+
+class NgramEncoder:
+    """
+    Character n-gram TF-IDF hashed into NGRAM_DIM buckets. Needs only numpy;
+    IDF weights come from the location list the index is built over. Buckets
+    use crc32 so persisted vectors stay valid across processes.
+    """
+
+    name = f"ngram{NGRAM_DIM}"
+
+    def __init__(self, idf: Optional[np.ndarray] = None):
+        self.idf = idf if idf is not None else np.ones(NGRAM_DIM, dtype=np.float32)
+
+    @staticmethod
+    def _buckets(text: str) -> np.ndarray:
+        padded = f" {text} "
+        grams = [
+            padded[i:i + n]
+            for n in NGRAM_SIZES
+            for i in range(len(padded) - n + 1)
+        ]
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) % NGRAM_DIM for g in grams), dtype=np.int64)
+
+    def _counts(self, texts: Sequence[str]) -> np.ndarray:
+        counts = np.zeros((len(texts), NGRAM_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            np.add.at(counts[row], self._buckets(text), 1.0)
+        return counts
+
+    def fit(self, texts: Sequence[str]) -> "NgramEncoder":
+        df = (self._counts(texts) > 0).sum(axis=0)
+        self.idf = (np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0).astype(np.float32)
+        return self
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.log1p(self._counts(texts)) * self.idf
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SentenceEncoder:
+    """Local sentence-transformers model, loaded once per process."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu", local_files_only=True)
+        self.name = "st-" + normalize_place_name(model_name)
+
+    def fit(self, texts: Sequence[str]) -> "SentenceEncoder":
+        return self
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self.model.encode(list(texts), batch_size=256, normalize_embeddings=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+
+def _sentence_encoder() -> Optional[SentenceEncoder]:
+    if not LOCAL_EMBEDDING_MODEL:
+        return None
+    with _ENCODER_LOCK:
+        if LOCAL_EMBEDDING_MODEL not in _ENCODERS:
+            try:
+                _ENCODERS[LOCAL_EMBEDDING_MODEL] = SentenceEncoder(LOCAL_EMBEDDING_MODEL)
+            except Exception:
+                # Not installed, or the model is not in the local cache
+                _ENCODERS[LOCAL_EMBEDDING_MODEL] = None
+        return _ENCODERS[LOCAL_EMBEDDING_MODEL]
+
+
+# ---------------- Index ----------------
+
+def locations_hash(locations: Sequence[Dict[str, Any]]) -> str:
+    """Stable key for a location list when the manifest carries no locations_object hash."""
+    payload = json.dumps([loc.get("place") for loc in locations], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _place_text(loc: Dict[str, Any]) -> str:
+    return normalize_text(loc.get("place") or loc.get("normalized_place", "").replace("-", " "))
+
+
+def _query_text(query: str) -> str:
+    return " ".join(query_terms(query)[1])
+
+
+class LocationVectorIndex:
+    """
+    Nearest-neighbour index over place-name embeddings for one location list.
+    Uses FAISS (exact inner product, or HNSW for large lists) when installed
+    and a numpy matrix product otherwise. Vectors are unit length, so inner
+    product is cosine similarity.
+    """
+
+    def __init__(self, encoder, vectors: np.ndarray, index=None):
+        self.encoder = encoder
+        self.vectors = vectors if index is None else None
+        self.index = index
+        self.size = int(index.ntotal) if index is not None else len(vectors)
+
+    @classmethod
+    def build(cls, locations: Sequence[Dict[str, Any]], encoder) -> "LocationVectorIndex":
+        texts = [_place_text(loc) for loc in locations]
+        encoder.fit(texts)
+        vectors = np.ascontiguousarray(encoder.encode(texts), dtype=np.float32)
+        if faiss is None:
+            return cls(encoder, vectors)
+        dim = vectors.shape[1]
+        if len(vectors) > FLAT_INDEX_MAX:
+            index = faiss.IndexHNSWFlat(dim, HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        else:
+            index = faiss.IndexFlatIP(dim)
+        index.add(vectors)
+        return cls(encoder, vectors, index)
+
+    def save(self, stem: Path) -> None:
+        stem.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(self.encoder, NgramEncoder):
+            np.save(f"{stem}.idf.npy", self.encoder.idf)
+        if self.index is not None:
+            faiss.write_index(self.index, f"{stem}.faiss")
+        else:
+            np.save(f"{stem}.vectors.npy", self.vectors)
+
+    @classmethod
+    def load(cls, stem: Path, encoder) -> Optional["LocationVectorIndex"]:
+        if isinstance(encoder, NgramEncoder):
+            idf_path = Path(f"{stem}.idf.npy")
+            if not idf_path.exists():
+                return None
+            encoder.idf = np.load(idf_path)
+        if faiss is not None and Path(f"{stem}.faiss").exists():
+            index = faiss.read_index(f"{stem}.faiss")
+            if isinstance(index, faiss.IndexHNSWFlat):
+                index.hnsw.efSearch = HNSW_EF_SEARCH
+            return cls(encoder, None, index)
+        if Path(f"{stem}.vectors.npy").exists():
+            return cls(encoder, np.load(f"{stem}.vectors.npy"))
+        return None
+
+    def encode_query(self, query: str) -> np.ndarray:
+        return np.ascontiguousarray(self.encoder.encode([_query_text(query)]), dtype=np.float32)
+
+    def search(self, query_vector: np.ndarray, k: int = VECTOR_CANDIDATES) -> List[Tuple[float, int]]:
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        if self.index is not None:
+            scores, ids = self.index.search(query_vector, k)
+            return [(float(s), int(i)) for s, i in zip(scores[0], ids[0]) if i >= 0]
+        sims = self.vectors @ query_vector[0]
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        return [(float(sims[i]), int(i)) for i in top]
+
+    def similarity(self, query_vector: np.ndarray, idx: int) -> float:
+        vector = self.index.reconstruct(int(idx)) if self.index is not None else self.vectors[idx]
+        return float(np.dot(vector, query_vector[0]))
+
+
+def _load_or_build(locations: Sequence[Dict[str, Any]], list_hash: str) -> LocationVectorIndex:
+    encoder = _sentence_encoder() or NgramEncoder()
+    stem = VECTOR_DIR / f"{list_hash}-{encoder.name}"
+    try:
+        loaded = LocationVectorIndex.load(stem, encoder)
+    except Exception:
+        loaded = None
+    if loaded is not None and loaded.size == len(locations):
+        return loaded
+    index = LocationVectorIndex.build(locations, encoder)
+    try:
+        index.save(stem)
+    except OSError:
+        pass  # read-only filesystem: keep the in-memory index
+    return index
+
+
+def vector_index_for_run(
+    run_id: str,
+    locations: Sequence[Dict[str, Any]],
+    list_hash: Optional[str] = None,
+) -> Optional[LocationVectorIndex]:
+    """
+    The run's vector index if it is ready. Otherwise starts one background
+    load/build (from disk when this location list was seen before) and
+    returns None, so callers fall back to lexical ranking meanwhile.
+    """
+    ready = _VECTOR_CACHE.get(run_id)
+    if ready is not None or not locations:
+        return ready
+    list_hash = list_hash or locations_hash(locations)
+    with _BUILD_LOCK:
+        worker = _BUILDING.get(run_id)
+        if worker is None or not worker.is_alive():
+            def _build():
+                try:
+                    _VECTOR_CACHE.get_or_load(run_id, lambda: _load_or_build(locations, list_hash))
+                except Exception:
+                    pass  # lexical ranking keeps working without vectors
+                finally:
+                    with _BUILD_LOCK:
+                        _BUILDING.pop(run_id, None)
+
+            worker = threading.Thread(target=_build, daemon=True)
+            _BUILDING[run_id] = worker
+            worker.start()
+    return None
+
+
+# ---------------- Fusion ----------------
+
+def resolve_locations(
+    query: str,
+    run_id: str,
+    locations: Sequence[Dict[str, Any]],
+    list_hash: Optional[str] = None,
+    limit: int = 5,
+    min_score: float = 0.5,
+) -> List[Tuple[float, Dict[str, Any]]]:
+    """
+    rank_locations fused with embedding similarity. Each location scores
+    its lexical score plus VECTOR_WEIGHT x cosine similarity, so lexical
+    order is kept when both agree. Places lexical search misses surface only
+    as close paraphrases (similarity >= MIN_SIMILARITY). Falls back
+    to lexical ranking alone while the vector index is loading.
+    """
+    lexical_index = location_index_for_run(run_id, locations)
+    lexical = rank_locations(query, lexical_index, limit=max(limit, VECTOR_CANDIDATES), min_score=min_score)
+    if lexical and lexical[0][0] >= 1e6:
+        return lexical[:1]  # exact slug match
+
+    vectors = vector_index_for_run(run_id, locations, list_hash)
+    if vectors is None:
+        return lexical[:limit]
+
+    query_vector = vectors.encode_query(query)
+    nearest = {idx: similarity for similarity, idx in vectors.search(query_vector)}
+    fused: Dict[int, float] = {}
+    for score, loc in lexical:
+        idx = lexical_index.positions[id(loc)]
+        similarity = nearest[idx] if idx in nearest else vectors.similarity(query_vector, idx)
+        fused[idx] = score + VECTOR_WEIGHT * max(similarity, 0.0)
+    for idx, similarity in nearest.items():
+        if idx not in fused and similarity >= MIN_SIMILARITY:
+            fused[idx] = VECTOR_WEIGHT * similarity
+
+    ranked = [
+        (score, lexical_index.locations[idx])
+        for idx, score in fused.items()
+        if score >= min_score
+    ]
+    ranked.sort(key=lambda x: (-x[0], x[1].get("place", "")))
+    return ranked[:limit]
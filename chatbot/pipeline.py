@@ -0,0 +1,276 @@
+# chatbot/pipeline.py
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from chatbot.location_spatial import extract_coordinates, mentions_current_location, nearest_location
+from chatbot.location_vectors import resolve_locations
+from chatbot.rain_summary import is_summary_question, summary_entry
+from chatbot.slots import SlotTable, slot_table_for_run
+from chatbot.supabase_ops import (
+    fetch_records_batch,
+    latest_complete_run_dir,
+    load_manifest,
+    resolve_offset_for_location,
+)
+
+PIPELINE_WORKERS = 8
+# Runner-up matches whose records are prefetched for follow-up questions
+SPECULATIVE_MATCHES = 3
+# Slots on each side of the chosen one prefetched for "and in 10 more minutes?"
+PREFETCH_NEIGHBOR_SLOTS = 1
+
+_POOL = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="chat-pipeline")
+# Location list of the most recent run, used to rank places before the
+# current run's manifest has been confirmed
+_LAST_RUN: Dict[str, Any] = {"run_id": None, "locations": None, "sha": None}
+_LAST_RUN_LOCK = threading.Lock()
+
+
+class QueryError(Exception):
+    """A step of the pipeline failed; the message is shown to the user as is."""
+
+
+def _locations_of(manifest: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    locations = manifest.get("locations") or []
+    return locations, (manifest.get("locations_object") or {}).get("sha256")
+
+
+def resolve_run() -> Tuple[str, Dict[str, Any], SlotTable]:
+    """Latest run id, its manifest and slot table."""
+    try:
+        run_id = latest_complete_run_dir()
+        if not run_id:
+            raise RuntimeError("No completed forecast run available yet.")
+        manifest = load_manifest(run_id)
+    except Exception as exc:
+        raise QueryError(f"⚠️ Unable to load forecast run: {exc}") from exc
+
+    try:
+        slot_table = slot_table_for_run(run_id, manifest)
+    except Exception as exc:
+        raise QueryError(f"⚠️ Manifest is missing base_time: {exc}") from exc
+    if not slot_table:
+        raise QueryError("⚠️ Manifest has no forecast time slots.")
+
+    locations, sha = _locations_of(manifest)
+    with _LAST_RUN_LOCK:
+        _LAST_RUN.update(run_id=run_id, locations=locations, sha=sha)
+    return run_id, manifest, slot_table
+
+
+def resolve_place(
+    query: str,
+    run_id: str,
+    locations: Sequence[Dict[str, Any]],
+    list_hash: Optional[str],
+    marker: Optional[Sequence[float]] = None,
+    cached_location: Optional[Dict[str, Any]] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[str], List[Dict[str, Any]]]:
+    """
+    (location, match description, runner-up locations) for a question.
+
+    Coordinates in the question, or "near me" with a pin on the map, are
+    answered from the spatial index; names go through the text resolver,
+    then the previous answer's place, then the map pin. The marker is only
+    ever one the user placed; "near me" without it resolves to nothing.
+    """
+    query_point = extract_coordinates(query)
+    near_me = query_point is None and mentions_current_location(query)
+    if near_me and marker:
+        query_point = (float(marker[0]), float(marker[1]))
+    if query_point is not None:
+        nearest = nearest_location(run_id, locations, *query_point)
+        if nearest:
+            distance_km, location = nearest
+            return location, f"nearest to {query_point[0]:.3f}, {query_point[1]:.3f} ({distance_km:.1f} km)", []
+
+    matches = resolve_locations(query, run_id, locations, list_hash=list_hash, limit=SPECULATIVE_MATCHES)
+    if matches:
+        best_score, location = matches[0]
+        return location, f"{best_score:.2f}", [loc for _, loc in matches[1:]]
+    if near_me:
+        # The previous answer's place is not where the user is
+        return None, None, []
+    if cached_location:
+        return cached_location, "previous query", []
+    if marker:
+        nearest = nearest_location(run_id, locations, float(marker[0]), float(marker[1]))
+        if nearest:
+            distance_km, location = nearest
+            return location, f"nearest to map pin ({distance_km:.1f} km)", []
+    return None, None, []
+
+
+def _record_items(
+    run_id: str,
+    slots: Sequence[Dict[str, Any]],
+    location: Dict[str, Any],
+) -> List[Tuple[str, Dict[str, Any], int, int]]:
+    location_index = int(location.get("location_index", -1))
+    items = []
+    for slot in slots:
+        offset, length = resolve_offset_for_location(
+            run_id=run_id,
+            filename=slot["filename"],
+            file_entry=slot["entry"],
+            location_index=location_index,
+        )
+        items.append((slot["filename"], slot["entry"], offset, length))
+    return items
+
+
+def _prefetch(run_id: str, slots: Sequence[Dict[str, Any]], locations: Sequence[Dict[str, Any]], winner, neighbors):
+    """Warm the record cache for likely follow-ups; failures only cost the warm-up."""
+    items = []
+    for location in locations:
+        try:
+            items.extend(_record_items(run_id, slots, location))
+        except Exception:
+            continue
+    try:
+        items.extend(_record_items(run_id, neighbors, winner))
+    except Exception:
+        pass
+    if items:
+        fetch_records_batch(run_id, items)
+
+
+def plan_query(
+    query: str,
+    offset_minutes: int,
+    window_minutes: Optional[int],
+    marker: Optional[Sequence[float]] = None,
+    cached_location: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Resolve everything a question needs before the model is called.
+
+    The run/manifest lookup and place ranking run concurrently: ranking
+    speculatively uses the previous run's location list and is kept when
+    the resolved run publishes the same list (same locations sha), and
+    redone otherwise. Records for the winning place are fetched in one
+    batch; records for runner-up places and neighbouring slots are
+    prefetched in the background (see "prefetch" in the result, which the
+    caller may cancel when a newer question arrives). Raises QueryError.
+    """
+    run_future = _POOL.submit(resolve_run)
+    with _LAST_RUN_LOCK:
+        speculative = dict(_LAST_RUN)
+    place_future: Optional[Future] = None
+    if speculative["run_id"] and speculative["locations"]:
+        place_future = _POOL.submit(
+            resolve_place,
+            query,
+            speculative["run_id"],
+            speculative["locations"],
+            speculative["sha"],
+            marker,
+            cached_location,
+        )
+
+    try:
+        run_id, manifest, slot_table = run_future.result()
+    except QueryError:
+        if place_future is not None:
+            place_future.cancel()
+        raise
+
+    locations, sha = _locations_of(manifest)
+    same_list = speculative["run_id"] == run_id or (sha is not None and sha == speculative["sha"])
+    place = None
+    if place_future is not None and same_list:
+        try:
+            place = place_future.result()
+        except Exception:
+            place = None
+    elif place_future is not None:
+        place_future.cancel()
+    if place is None:
+        place = resolve_place(query, run_id, locations, sha, marker, cached_location)
+    location, score_display, runners_up = place
+
+    if location is None:
+        if mentions_current_location(query) and not marker:
+            raise QueryError(
+                "📍 Place a marker on the radar map (📍 Select Location) or name a place, "
+                "and I'll check the rain there."
+            )
+        raise QueryError("⚠️ I couldn't find that place in the latest forecast data.")
+    normalized_place = location.get("normalized_place")
+    if not normalized_place:
+        raise QueryError("⚠️ Selected location is missing a normalized key.")
+
+    target_dt_utc = datetime.now(timezone.utc) + timedelta(minutes=offset_minutes)
+    try:
+        selected_slot = slot_table.nearest(target_dt_utc)
+    except Exception as exc:
+        raise QueryError(f"⚠️ Unable to pick forecast slot: {exc}") from exc
+
+    # Onset/peak questions read the run's per-location summary record. When
+    # that covers the asked window, it replaces the per-slot timeline
+    summary = summary_entry(manifest) if is_summary_question(query) else None
+    window_end = target_dt_utc + timedelta(minutes=window_minutes or 0)
+    if summary and slot_table.last_valid_utc and window_end >= slot_table.last_valid_utc:
+        window_minutes = None
+
+    # A timeline question pulls every slot in the window; all records come
+    # back from one batched range fetch instead of one request per slot
+    if window_minutes:
+        timeline_slots = slot_table.window(target_dt_utc, window_end)
+        if selected_slot not in timeline_slots:
+            timeline_slots.append(selected_slot)
+            timeline_slots.sort(key=lambda slot: slot["valid_dt_utc"])
+    else:
+        timeline_slots = [selected_slot]
+
+    items = []
+    for slot in timeline_slots:
+        try:
+            items.extend(_record_items(run_id, [slot], location))
+        except Exception as exc:
+            raise QueryError(
+                f"⚠️ No record found for `{normalized_place}` in {slot['filename']} ({exc})."
+            ) from exc
+    if summary:
+        try:
+            items.extend(_record_items(run_id, [{"filename": summary["filename"], "entry": summary}], location))
+        except Exception:
+            # The summary only enriches the answer; go on without it
+            summary = None
+
+    # Runner-up warm-up starts now and overlaps the winner's fetch
+    position = slot_table.slots.index(selected_slot)
+    neighbors = [
+        slot
+        for slot in slot_table.slots[max(0, position - PREFETCH_NEIGHBOR_SLOTS):position + PREFETCH_NEIGHBOR_SLOTS + 1]
+        if slot not in timeline_slots
+    ]
+    prefetch = None
+    if runners_up or neighbors:
+        prefetch = _POOL.submit(_prefetch, run_id, timeline_slots, runners_up, location, neighbors)
+
+    try:
+        records = fetch_records_batch(run_id, items)
+    except Exception as exc:
+        raise QueryError(f"⚠️ Unable to download forecast record: {exc}") from exc
+    timeline_records = records[: len(timeline_slots)]
+    rain_summary = records[len(timeline_slots)] if summary else None
+
+    return {
+        "run_id": run_id,
+        "manifest": manifest,
+        "slot_table": slot_table,
+        "target_dt_utc": target_dt_utc,
+        "selected_slot": selected_slot,
+        "timeline_slots": timeline_slots,
+        "timeline_records": timeline_records,
+        "record": timeline_records[timeline_slots.index(selected_slot)],
+        "location": location,
+        "normalized_place": normalized_place,
+        "score_display": score_display,
+        "window_minutes": window_minutes,
+        "rain_summary": rain_summary,
+        "prefetch": prefetch,
+    }
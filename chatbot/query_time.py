@@ -10,6 +10,16 @@ RE_HR = re.compile(
     r"\bin\s*(?:the\s+)?(?:next\s+)?(\d+)\s*(?:hr|hrs|hour|hours)\b",
     re.I,
 )
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4,
+    "five": 5, "six": 6, "half": 0.5,
+}
+RE_WINDOW = re.compile(
+    r"\b(?:over|within|during|throughout|for)\s+(?:the\s+)?(?:next\s+)?"
+    r"(\d+|an?|one|two|three|four|five|six|half)\s*(?:an?\s+)?"
+    r"(min|mins|minute|minutes|hr|hrs|hour|hours)\b",
+    re.I,
+)
 
 def extract_offset_minutes(text: str) -> Optional[int]:
     """
@@ -26,3 +36,23 @@ def extract_offset_minutes(text: str) -> Optional[int]:
     if m_min:
         return int(m_min.group(1))
     return None
+
+
+def extract_window_minutes(text: str) -> Optional[int]:
+    """
+    Parse timeline phrases like:
+      - 'over the next 2 hours'
+      - 'within 30 mins'
+      - 'for the next hour' / 'throughout the next half hour'
+    Returns the window length in minutes, or None if the question is about a
+    single point in time.
+    """
+    m = RE_WINDOW.search(text)
+    if not m:
+        # 'for the next hour' has no explicit count
+        m_bare = re.search(r"\b(?:over|within|during|throughout|for)\s+the\s+next\s+(hour|hr)\b", text, re.I)
+        return 60 if m_bare else None
+    count, unit = m.group(1).lower(), m.group(2).lower()
+    value = float(count) if count.isdigit() else _NUMBER_WORDS[count]
+    minutes = value * 60 if unit.startswith("h") else value
+    return int(minutes) if minutes > 0 else None
@@ -0,0 +1,60 @@
+# chatbot/rain_summary.py
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+MANILA_TZ = timezone(timedelta(hours=8))
+
+# "When does it start/stop", "how long", "what's the worst/peak" — questions
+# the per-location timeline summary answers from a single record
+RE_SUMMARY_QUESTION = re.compile(
+    r"\b(?:when|what\s+time|how\s+long|until|till|start|starts|starting|begin|begins|stop|stops|"
+    r"end|ends|ease|eases|clear|clears|worst|peak|heaviest|strongest|max(?:imum)?)\b",
+    re.I,
+)
+
+
+def is_summary_question(query: str) -> bool:
+    return bool(RE_SUMMARY_QUESTION.search(query or ""))
+
+
+def summary_entry(manifest: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The run's timeline summary file entry, or None for runs published without one."""
+    entry = manifest.get("timeline_summary")
+    if not entry or not entry.get("hash_lookup"):
+        return None
+    return entry
+
+
+def _local(base_time_utc: datetime, lead_minutes: int) -> str:
+    return (base_time_utc + timedelta(minutes=int(lead_minutes))).astimezone(MANILA_TZ).strftime("%I:%M %p")
+
+
+def summary_lines(record: Dict[str, Any], base_time_utc: datetime, horizon_utc: Optional[datetime] = None) -> List[str]:
+    """
+    Readable outlook lines from a timeline summary record: the peak, then
+    when each rain band starts, how long it lasts and when it last appears.
+    Used both in the model context and in the templated fallback.
+    """
+    lines: List[str] = []
+    horizon = f" through {horizon_utc.astimezone(MANILA_TZ).strftime('%I:%M %p')}" if horizon_utc else ""
+    peak = record.get("peak_reflectivity")
+    if peak is not None:
+        lines.append(
+            f"Peak{horizon}: {peak:.1f} dBZ ({record.get('peak_category') or 'Unknown'}) "
+            f"around {_local(base_time_utc, record.get('peak_lead_minutes') or 0)}"
+        )
+    reached = False
+    for band, info in (record.get("thresholds") or {}).items():
+        onset = info.get("onset_lead_minutes")
+        if onset is None:
+            continue
+        reached = True
+        lines.append(
+            f"{band} rain or stronger: from {_local(base_time_utc, onset)} "
+            f"to {_local(base_time_utc, info.get('until_lead_minutes', onset))}, "
+            f"about {info.get('minutes_above', 0)} min in total"
+        )
+    if not reached:
+        lines.append(f"No rain above very light expected{horizon}.")
+    return lines
@@ -1,13 +1,26 @@
+import os
+
 import streamlit as st
-from chatbot.bot_setup import CHAT_MODEL, gen_ai
+
+from chatbot.context import BoundedChat
+
 
 def get_model():
+    from chatbot.bot_setup import CHAT_MODEL, gen_ai
+
     return gen_ai.GenerativeModel(model_name=CHAT_MODEL)
 
 def get_chat_session():
     if "chat_session" not in st.session_state:
-        model = get_model()
-        st.session_state.chat_session = model.start_chat(history=[])
+        if os.getenv("RAINLOOP_FAKE_LLM"):
+            # Offline model for local runs and streaming checks; no API key needed
+            from chatbot.streaming import FakeModel
+
+            model = FakeModel(first_token_delay=float(os.getenv("RAINLOOP_FAKE_LLM_DELAY", "0.5")))
+        else:
+            model = get_model()
+        # Bounded history: recent turns verbatim, older ones as a short digest
+        st.session_state.chat_session = BoundedChat(model)
     return st.session_state.chat_session
 
 def clear_chat_session():
@@ -0,0 +1,171 @@
+# chatbot/slots.py
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from chatbot.cache import TTLCache
+
+MANILA_TZ = timezone(timedelta(hours=8))
+MAX_CACHED_TABLES = 4
+
+_SLOT_CACHE = TTLCache("slot_tables", max_entries=MAX_CACHED_TABLES)
+
+
+def _parse_iso_to_utc(value: str) -> datetime:
+    cleaned = (value or "").strip()
+    if not cleaned:
+        raise ValueError("Datetime string is empty")
+    if cleaned.endswith("Z"):
+        cleaned = cleaned[:-1] + "+00:00"
+    dt = datetime.fromisoformat(cleaned)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _select_best_slot(slots, target_dt: datetime):
+    """Linear reference for SlotTable.nearest: closest valid time, later slot on ties."""
+    if not slots:
+        raise ValueError("No forecast slots are available.")
+    target_dt = target_dt.astimezone(timezone.utc)
+    best = None
+    best_key = (float("inf"), True)
+    for slot in slots:
+        valid_dt = slot["valid_dt_utc"].astimezone(timezone.utc)
+        diff_seconds = (valid_dt - target_dt).total_seconds()
+        key = (abs(diff_seconds), diff_seconds < 0)
+        if key < best_key:
+            best_key = key
+            best = slot
+    return best
+
+
+def _manifest_base_time(manifest: Dict[str, Any]) -> datetime:
+    base_time_iso = manifest.get("base_time_utc") or manifest["base_time"]
+    base_time_utc = datetime.fromisoformat(base_time_iso)
+    if base_time_utc.tzinfo is None:
+        return base_time_utc.replace(tzinfo=timezone.utc)
+    return base_time_utc.astimezone(timezone.utc)
+
+
+def _manifest_slots(manifest: Dict[str, Any], base_time_utc: datetime) -> List[Dict[str, Any]]:
+    lead_bins = manifest.get("lead_bins") or []
+    files = manifest.get("files") or {}
+    slots: List[Dict[str, Any]] = []
+
+    for filename, entry in files.items():
+        if not isinstance(filename, str) or not filename.endswith(".jsonl"):
+            continue
+        lead_value = entry.get("lead_minutes")
+        valid_iso = entry.get("valid_time_utc") or entry.get("valid_time")
+        valid_dt_utc = None
+
+        if isinstance(valid_iso, str):
+            try:
+                valid_dt_utc = _parse_iso_to_utc(valid_iso)
+            except Exception:
+                valid_dt_utc = None
+
+        if valid_dt_utc is None and lead_value is not None:
+            try:
+                valid_dt_utc = base_time_utc + timedelta(minutes=int(lead_value))
+            except Exception:
+                valid_dt_utc = None
+
+        if valid_dt_utc is None:
+            continue
+
+        try:
+            lead_int = int(lead_value)
+        except Exception:
+            diff_minutes = (valid_dt_utc - base_time_utc).total_seconds() / 60.0
+            lead_int = int(round(diff_minutes))
+
+        slots.append(
+            {
+                "filename": filename,
+                "entry": entry,
+                "lead_minutes": lead_int,
+                "valid_dt_utc": valid_dt_utc,
+                "valid_time_label": entry.get("valid_time_label"),
+            }
+        )
+
+    # Older manifests only list lead_bins with lead_XXX.jsonl files
+    if not slots and lead_bins:
+        for minutes in lead_bins:
+            try:
+                minutes_int = int(minutes)
+            except Exception:
+                continue
+            legacy_name = f"lead_{minutes_int:03d}.jsonl"
+            entry = files.get(legacy_name)
+            if not entry:
+                continue
+            valid_dt_utc = base_time_utc + timedelta(minutes=minutes_int)
+            slots.append(
+                {
+                    "filename": legacy_name,
+                    "entry": entry,
+                    "lead_minutes": minutes_int,
+                    "valid_dt_utc": valid_dt_utc,
+                    "valid_time_label": entry.get("valid_time_label")
+                    or valid_dt_utc.astimezone(MANILA_TZ).strftime("%Y%m%dT%H%MPHT"),
+                }
+            )
+
+    slots.sort(key=lambda slot: slot["valid_dt_utc"])
+    return slots
+
+
+class SlotTable:
+    """
+    A run's forecast slots sorted by valid time, with a parallel list of
+    epoch seconds so nearest-slot and window lookups are bisections. Built
+    once per run and shared by every session; treat it as read-only.
+    """
+
+    def __init__(self, base_time_utc: datetime, slots: List[Dict[str, Any]]):
+        self.base_time_utc = base_time_utc
+        self.slots = slots
+        self.epochs = [slot["valid_dt_utc"].timestamp() for slot in slots]
+
+    @classmethod
+    def from_manifest(cls, manifest: Dict[str, Any]) -> "SlotTable":
+        """Raises KeyError/ValueError when the manifest has no usable base_time."""
+        base_time_utc = _manifest_base_time(manifest)
+        return cls(base_time_utc, _manifest_slots(manifest, base_time_utc))
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @property
+    def last_valid_utc(self) -> Optional[datetime]:
+        return self.slots[-1]["valid_dt_utc"] if self.slots else None
+
+    def nearest(self, target_dt: datetime) -> Dict[str, Any]:
+        """Slot closest to target_dt; on an exact tie the later slot wins."""
+        if not self.slots:
+            raise ValueError("No forecast slots are available.")
+        target = target_dt.timestamp()
+        after = bisect_left(self.epochs, target)
+        if after == len(self.epochs):
+            return self.slots[bisect_left(self.epochs, self.epochs[-1])]
+        if after == 0:
+            return self.slots[0]
+        before_epoch = self.epochs[after - 1]
+        if target - before_epoch < self.epochs[after] - target:
+            # First slot sharing that valid time, as the linear scan picks
+            return self.slots[bisect_left(self.epochs, before_epoch)]
+        return self.slots[after]
+
+    def window(self, start_dt: datetime, end_dt: datetime) -> List[Dict[str, Any]]:
+        """Slots valid between start_dt and end_dt inclusive, in time order."""
+        lo = bisect_left(self.epochs, start_dt.timestamp())
+        hi = bisect_right(self.epochs, end_dt.timestamp())
+        return self.slots[lo:hi]
+
+
+def slot_table_for_run(run_id: str, manifest: Dict[str, Any]) -> SlotTable:
+    """Shared SlotTable for a run, built once per process."""
+    return _SLOT_CACHE.get_or_load(run_id, lambda: SlotTable.from_manifest(manifest))
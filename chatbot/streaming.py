@@ -0,0 +1,209 @@
+# chatbot/streaming.py
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Seconds to wait for the model's first chunk before showing the templated answer
+FIRST_TOKEN_DEADLINE = float(os.getenv("CHAT_FIRST_TOKEN_SECONDS", "8"))
+# Seconds to wait between chunks once streaming has started
+STREAM_IDLE_TIMEOUT = float(os.getenv("CHAT_STREAM_IDLE_SECONDS", "30"))
+
+_DONE = object()
+
+SAFETY_TIPS: Dict[str, List[str]] = {
+    "Extremely heavy": [
+        "Stay indoors and avoid all non-essential travel until the rain eases.",
+        "Keep away from rivers, drainage canals and low-lying roads that can flood within minutes.",
+        "Prepare an emergency kit and follow advisories from local authorities.",
+    ],
+    "Heavy": [
+        "Postpone travel if you can, and never drive through flooded roads.",
+        "Stay clear of flood-prone areas, streams and open drains.",
+        "Unplug sensitive electronics and watch for lightning.",
+    ],
+    "Moderate": [
+        "Carry an umbrella or raincoat if you need to go out.",
+        "Drive slower and keep a longer following distance on wet roads.",
+        "Watch for ponding water on streets and walkways.",
+    ],
+    "Light": [
+        "Bring an umbrella in case the drizzle picks up.",
+        "Take care on slippery sidewalks and stairs.",
+        "Keep headlights on when driving in reduced visibility.",
+    ],
+    "Very light": [
+        "Conditions look mostly dry, but keep an umbrella handy.",
+        "Check the nowcast again before heading out for a longer trip.",
+        "Stay hydrated and plan outdoor activities around any passing showers.",
+    ],
+}
+DEFAULT_TIPS = [
+    "Check the latest nowcast before heading out.",
+    "Keep an umbrella or raincoat within reach.",
+    "Follow advisories from local authorities.",
+]
+
+
+def templated_answer(
+    place: Optional[str],
+    valid_local: str,
+    reflectivity: Any,
+    rain_category: Optional[str],
+    timeline: Optional[Sequence[Dict[str, Any]]] = None,
+    outlook: Optional[Sequence[str]] = None,
+) -> str:
+    """
+    Answer assembled from the forecast record alone, shown when the model is
+    slow or unavailable. timeline items carry 'valid_local', 'reflectivity'
+    and 'rain_category'; outlook lines come from chatbot.rain_summary.
+    """
+    category = rain_category or "Unknown"
+    place = place or "the selected location"
+    if reflectivity is None:
+        intensity = f"**{category}** rain"
+    else:
+        intensity = f"**{category}** rain ({reflectivity} dBZ)"
+    lines = [f"Around **{valid_local}**, {place} can expect {intensity}."]
+    if timeline and len(timeline) > 1:
+        lines.append("")
+        lines.append("Timeline:")
+        lines.extend(
+            f"- {item['valid_local']}: {item.get('rain_category') or 'Unknown'}"
+            f" ({item.get('reflectivity')} dBZ)"
+            for item in timeline
+        )
+    if outlook:
+        lines.append("")
+        lines.append("Outlook:")
+        lines.extend(f"- {line}" for line in outlook)
+    lines.append("")
+    lines.append("Safety tips:")
+    lines.extend(f"- {tip}" for tip in SAFETY_TIPS.get(category, DEFAULT_TIPS))
+    return "\n".join(lines)
+
+
+def _chunk_text(chunk: Any) -> str:
+    if isinstance(chunk, str):
+        return chunk
+    try:
+        return chunk.text or ""
+    except Exception:
+        # Gemini raises on .text for chunks that only carry safety metadata
+        return ""
+
+
+def stream_answer(
+    chat: Any,
+    prompt: str,
+    fallback: str,
+    first_token_deadline: float = FIRST_TOKEN_DEADLINE,
+    idle_timeout: float = STREAM_IDLE_TIMEOUT,
+    outcome: Optional[Dict[str, Any]] = None,
+) -> Iterator[str]:
+    """
+    Yield the model's answer chunk by chunk for st.write_stream.
+
+    The request runs on a worker thread. If no text arrives within
+    first_token_deadline seconds, or the model fails before producing any,
+    the fallback text is yielded instead and the late response is ignored.
+    A failure or stall after text has started ends the stream with a short
+    note rather than discarding what was already shown.
+
+    If an outcome dict is passed, its "complete" key ends up True only when
+    the model's full answer was streamed.
+    """
+    if outcome is not None:
+        outcome["complete"] = False
+    chunks: "queue.Queue[Any]" = queue.Queue()
+
+    def _worker():
+        try:
+            for chunk in chat.send_message(prompt, stream=True):
+                text = _chunk_text(chunk)
+                if text:
+                    chunks.put(text)
+        except Exception as exc:
+            chunks.put(exc)
+        finally:
+            chunks.put(_DONE)
+
+    threading.Thread(target=_worker, daemon=True).start()
+
+    started = False
+    deadline = time.monotonic() + first_token_deadline
+    while True:
+        timeout = max(0.0, deadline - time.monotonic()) if not started else idle_timeout
+        try:
+            item = chunks.get(timeout=timeout)
+        except queue.Empty:
+            if not started:
+                yield fallback
+            else:
+                yield "\n\n_⚠️ The assistant stopped responding; the answer above may be incomplete._"
+            return
+        if item is _DONE or isinstance(item, Exception):
+            if not started:
+                yield fallback
+            elif isinstance(item, Exception):
+                yield f"\n\n_⚠️ Response interrupted: {item}_"
+            elif outcome is not None:
+                outcome["complete"] = True
+            return
+        started = True
+        yield item
+
+
+class FakeChatSession:
+    """
+    Offline stand-in for a Gemini chat session. Streams a canned or echoed
+    answer word by word after first_token_delay seconds, so the streaming
+    path and its deadline can be exercised without an API key. Enabled in
+    the app with RAINLOOP_FAKE_LLM=1 (see chatbot.session).
+    """
+
+    def __init__(
+        self,
+        reply: Optional[str] = None,
+        first_token_delay: float = 0.5,
+        chunk_delay: float = 0.05,
+        fail: bool = False,
+    ):
+        self.reply = reply
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.fail = fail
+        self.history: List[Dict[str, str]] = []
+
+    def send_message(self, prompt: str, stream: bool = False):
+        reply = self.reply or (
+            "This is a local test reply. The forecast record I was given:\n\n"
+            + prompt.split("Forecast record:", 1)[-1].split("User question:", 1)[0].strip()
+        )
+        self.history.append({"role": "user", "text": prompt})
+
+        def _chunks():
+            time.sleep(self.first_token_delay)
+            if self.fail:
+                raise RuntimeError("fake model failure")
+            for word in reply.split(" "):
+                yield word + " "
+                time.sleep(self.chunk_delay)
+            self.history.append({"role": "model", "text": reply})
+
+        if stream:
+            return _chunks()
+        return type("FakeResponse", (), {"text": "".join(_chunks())})()
+
+
+class FakeModel:
+    """Model counterpart of FakeChatSession: start_chat hands out fake sessions."""
+
+    def __init__(self, **session_kwargs: Any):
+        self.session_kwargs = session_kwargs
+
+    def start_chat(self, history: Optional[List[Dict[str, Any]]] = None) -> FakeChatSession:
+        session = FakeChatSession(**self.session_kwargs)
+        session.history = list(history or [])
+        return session
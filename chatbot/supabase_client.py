@@ -1,4 +1,9 @@
 import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
 from supabase import create_client, Client
 from dotenv import load_dotenv
 import streamlit as st
@@ -8,11 +13,16 @@ CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../config/.env.example')
 # Load the environment variables
 load_dotenv(dotenv_path=CONFIG_PATH, override=True)
 
-def get_client() -> Client:
-    """
-    Create and return a Supabase client using the credentials
-    from config/.env.
-    """
+# Keep-alive pool sizes for the shared HTTP session (hosts, connections per host)
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 32
+
+_CLIENT: Optional[Client] = None
+_HTTP_SESSION: Optional[requests.Session] = None
+_LOCK = threading.Lock()
+
+
+def _create_client() -> Client:
     # Prefer Streamlit secrets for Streamlit runtime; fallback to environment
     url = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
     key = os.getenv("SUPABASE_KEY") or st.secrets.get("SUPABASE_KEY")
@@ -23,3 +33,37 @@ def get_client() -> Client:
         )
 
     return create_client(url, key)
+
+
+def get_client() -> Client:
+    """
+    Return the process-wide Supabase client, created on first use from the
+    credentials in config/.env. Shared by all Streamlit sessions.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        with _LOCK:
+            if _CLIENT is None:
+                _CLIENT = _create_client()
+    return _CLIENT
+
+
+def get_http_session() -> requests.Session:
+    """
+    Return the process-wide keep-alive requests.Session used for direct
+    object reads (e.g. byte-range GETs), so repeated fetches reuse
+    TCP/TLS connections instead of opening new ones.
+    """
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        with _LOCK:
+            if _HTTP_SESSION is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _HTTP_SESSION = session
+    return _HTTP_SESSION
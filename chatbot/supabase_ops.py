@@ -1,22 +1,45 @@
 import base64
 import json
+import re
 import struct
-import time
 import zlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 
-import requests
-
-from chatbot.supabase_client import get_client
+from chatbot.cache import TTLCache
+from chatbot.location_lookup import location_index_for_run
+from chatbot.location_vectors import vector_index_for_run
+from chatbot.supabase_client import get_client, get_http_session
 
 BUCKET = "radar-predicted"
 RUNS_PREFIX = "runs"
 LATEST_MARKER_PATH = "latest.txt"
-
-_LATEST_CACHE: Dict[str, Any] = {"value": None, "expires": 0.0}
-_MANIFEST_CACHE: Dict[str, Dict[str, Any]] = {}
-_MANIFEST_EXPIRY: Dict[str, float] = {}
-_LOOKUP_CACHE: Dict[Tuple[str, str], bytes] = {}
+# Ranges closer than this many bytes are fetched as one span
+RANGE_MERGE_GAP = 4096
+# Most distinct spans requested from one object in a single multi-range GET
+MAX_RANGES_PER_REQUEST = 32
+MAX_PARALLEL_FETCHES = 8
+
+_CONTENT_RANGE_RE = re.compile(r"bytes\s+(\d+)-(\d+)/", re.IGNORECASE)
+
+# Cache lifetimes (seconds) and sizes; everything is keyed by run id, so
+# entries for superseded runs age out instead of accumulating
+LATEST_TTL = 60.0
+MANIFEST_TTL = 300.0
+RECORD_TTL = 30 * 60.0
+# How long past its TTL an entry keeps serving while a refresh runs
+LATEST_MAX_STALE = 10 * 60.0
+MANIFEST_MAX_STALE = 60 * 60.0
+MAX_CACHED_MANIFESTS = 4
+MAX_CACHED_LOOKUPS = 256      # one per (run, lead file)
+MAX_CACHED_RECORDS = 4096     # one per (run, lead file, location)
+
+_LATEST_CACHE = TTLCache("latest_run", max_entries=1, ttl=LATEST_TTL, max_stale=LATEST_MAX_STALE)
+_MANIFEST_CACHE = TTLCache(
+    "manifests", max_entries=MAX_CACHED_MANIFESTS, ttl=MANIFEST_TTL, max_stale=MANIFEST_MAX_STALE
+)
+_LOOKUP_CACHE = TTLCache("hash_lookups", max_entries=MAX_CACHED_LOOKUPS)
+_RECORD_CACHE = TTLCache("records", max_entries=MAX_CACHED_RECORDS, ttl=RECORD_TTL)
 
 
 def _storage():
@@ -85,14 +108,7 @@ def _discover_latest_run_via_listing() -> Optional[str]:
     return run_candidates[-1]
 
 
-def latest_complete_run_dir(force_refresh: bool = False) -> Optional[str]:
-    """
-    Returns the latest run_id (without trailing slash). Cached for 60 seconds.
-    """
-    now = time.monotonic()
-    if not force_refresh and now < _LATEST_CACHE.get("expires", 0.0):
-        return _LATEST_CACHE.get("value")
-
+def _load_latest_run_id() -> Optional[str]:
     run_id: Optional[str] = None
     try:
         latest_bytes = download_file(LATEST_MARKER_PATH)
@@ -102,72 +118,227 @@ def latest_complete_run_dir(force_refresh: bool = False) -> Optional[str]:
 
     if not run_id:
         run_id = _discover_latest_run_via_listing()
-
-    expiry = now + 60.0
-    _LATEST_CACHE["value"] = run_id
-    _LATEST_CACHE["expires"] = expiry
     return run_id
 
 
-def load_manifest(run_id: str, force_refresh: bool = False) -> Dict[str, Any]:
+def latest_complete_run_dir(force_refresh: bool = False) -> Optional[str]:
     """
-    Download and cache manifest.json for a given run.
-    Cache TTL: 300 seconds.
+    Returns the latest run_id (without trailing slash). Cached for 60 seconds;
+    after that the previous answer is served while one background refresh
+    runs, and concurrent cold callers share a single lookup.
     """
-    now = time.monotonic()
-    expiry = _MANIFEST_EXPIRY.get(run_id, 0.0)
-    if not force_refresh and now < expiry and run_id in _MANIFEST_CACHE:
-        return _MANIFEST_CACHE[run_id]
+    return _LATEST_CACHE.get_or_load("latest", _load_latest_run_id, force=force_refresh)
+
 
+def _load_manifest(run_id: str) -> Dict[str, Any]:
     path = f"{RUNS_PREFIX}/{run_id}/manifest.json"
     manifest_bytes = download_file(path)
     manifest = json.loads(manifest_bytes.decode("utf-8"))
     manifest.setdefault("run_id", run_id)
-    _MANIFEST_CACHE[run_id] = manifest
-    _MANIFEST_EXPIRY[run_id] = now + 300.0
-    # Drop any cached hash lookups for this run to avoid stale data
-    stale_keys = [key for key in _LOOKUP_CACHE if key[0] == run_id]
-    for key in stale_keys:
-        _LOOKUP_CACHE.pop(key, None)
+    locations_object = manifest.get("locations_object") or {}
+    if "locations" not in manifest and locations_object.get("path"):
+        locations_bytes = download_file(locations_object["path"])
+        manifest["locations"] = json.loads(locations_bytes.decode("utf-8"))
+    # Build the location search indexes now so the first question for this
+    # run does not pay for them; the vector index loads in the background
+    location_index_for_run(run_id, manifest.get("locations") or [])
+    vector_index_for_run(run_id, manifest.get("locations") or [], locations_object.get("sha256"))
+    # Drop any cached hash lookups and records for this run to avoid stale data
+    _LOOKUP_CACHE.drop_where(lambda key: key[0] == run_id)
+    _RECORD_CACHE.drop_where(lambda key: key[0] == run_id)
     return manifest
 
 
+def load_manifest(run_id: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """
+    Download and cache manifest.json for a given run.
+    Cache TTL: 300 seconds, refreshed in the background once expired.
+    Concurrent sessions share one download per run.
+    """
+    return _MANIFEST_CACHE.get_or_load(run_id, lambda: _load_manifest(run_id), force=force_refresh)
+
+
 def fetch_range_bytes(path_in_bucket: str, start: int, length: int, timeout: float = 10.0) -> bytes:
     """
-    Perform an HTTP Range GET against Supabase public URL.
+    Perform an HTTP Range GET against Supabase public URL over the shared
+    keep-alive session.
     """
     if length <= 0:
         return b""
     end = start + length - 1
     headers = {"Range": f"bytes={start}-{end}"}
     url = _get_public_url(path_in_bucket)
-    resp = requests.get(url, headers=headers, timeout=timeout)
+    resp = get_http_session().get(url, headers=headers, timeout=timeout)
     if resp.status_code not in (200, 206):
         raise RuntimeError(
             f"Range GET failed for {path_in_bucket} ({resp.status_code}): {resp.text[:200]}"
         )
     content = resp.content
+    if resp.status_code == 200:
+        # Range ignored; the full object came back
+        content = content[start:]
     if len(content) > length:
         content = content[:length]
     return content
 
 
-def fetch_record_json(run_id: str, filename: str, offset: int, length: int) -> Dict[str, Any]:
+def record_file_path(run_id: str, filename: str, file_entry: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Bucket path of a lead file: its content-addressed object when the manifest
+    provides one, otherwise the legacy per-run location.
+    """
+    object_path = (file_entry or {}).get("object_path")
+    return object_path or f"{RUNS_PREFIX}/{run_id}/{filename}"
+
+
+def fetch_record_json(
+    run_id: str,
+    filename: str,
+    offset: int,
+    length: int,
+    file_entry: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
     """
     Fetch a single JSON line using manifest-provided byte offsets.
     """
-    path = f"{RUNS_PREFIX}/{run_id}/{filename}"
+    path = record_file_path(run_id, filename, file_entry)
+    cache_key = (run_id, path, offset, length)
+    record = _RECORD_CACHE.get(cache_key)
+    if record is not None:
+        return record
     raw = fetch_range_bytes(path, offset, length)
     text = raw.decode("utf-8").rstrip("\n")
     if not text:
         raise ValueError(f"No data returned for {filename} [{offset}, {length}]")
-    return json.loads(text)
+    record = json.loads(text)
+    _RECORD_CACHE.set(cache_key, record)
+    return record
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]], max_gap: int = RANGE_MERGE_GAP) -> List[Tuple[int, int]]:
+    """
+    Merge (offset, length) ranges that overlap or sit within max_gap bytes of
+    each other into sorted (start, end_exclusive) spans.
+    """
+    spans: List[List[int]] = []
+    for offset, length in sorted(ranges):
+        end = offset + length
+        if spans and offset <= spans[-1][1] + max_gap:
+            spans[-1][1] = max(spans[-1][1], end)
+        else:
+            spans.append([offset, end])
+    return [(start, end) for start, end in spans]
+
+
+def _parse_multipart_byteranges(content: bytes, content_type: str) -> Dict[int, bytes]:
+    """
+    Split a multipart/byteranges body into {range_start: part_bytes}.
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not match:
+        raise ValueError("multipart/byteranges response without boundary")
+    delimiter = b"--" + match.group(1).encode("ascii")
+    parts: Dict[int, bytes] = {}
+    for chunk in content.split(delimiter):
+        if not chunk.strip() or chunk.startswith(b"--"):
+            continue
+        head, sep, body = chunk.partition(b"\r\n\r\n")
+        if not sep:
+            continue
+        range_match = _CONTENT_RANGE_RE.search(head.decode("latin-1"))
+        if not range_match:
+            continue
+        start, end = int(range_match.group(1)), int(range_match.group(2))
+        parts[start] = body[: end - start + 1]
+    return parts
+
+
+def _fetch_spans(path_in_bucket: str, spans: List[Tuple[int, int]], timeout: float = 10.0) -> Dict[int, bytes]:
+    """
+    Fetch several (start, end_exclusive) spans of one object, returning
+    {span_start: bytes}. Uses one multi-range GET when the server honours it
+    and falls back to one pooled Range GET per span otherwise.
+    """
+    if len(spans) == 1:
+        start, end = spans[0]
+        return {start: fetch_range_bytes(path_in_bucket, start, end - start, timeout=timeout)}
+
+    header = ",".join(f"{start}-{end - 1}" for start, end in spans)
+    url = _get_public_url(path_in_bucket)
+    resp = get_http_session().get(url, headers={"Range": f"bytes={header}"}, timeout=timeout)
+    content_type = resp.headers.get("Content-Type", "")
+
+    if resp.status_code == 206 and content_type.startswith("multipart/byteranges"):
+        parts = _parse_multipart_byteranges(resp.content, content_type)
+        if all(start in parts for start, _ in spans):
+            return parts
+    elif resp.status_code == 206:
+        # Server coalesced everything into one range; slice it locally
+        range_match = _CONTENT_RANGE_RE.search(resp.headers.get("Content-Range", ""))
+        first = int(range_match.group(1)) if range_match else spans[0][0]
+        body = resp.content
+        if range_match and int(range_match.group(2)) >= spans[-1][1] - 1:
+            return {start: body[start - first:end - first] for start, end in spans}
+    elif resp.status_code == 200:
+        body = resp.content
+        return {start: body[start:end] for start, end in spans}
+
+    return {
+        start: fetch_range_bytes(path_in_bucket, start, end - start, timeout=timeout)
+        for start, end in spans
+    }
+
+
+def fetch_records_batch(
+    run_id: str,
+    items: List[Tuple[str, Dict[str, Any], int, int]],
+) -> List[Dict[str, Any]]:
+    """
+    Fetch many JSONL records at once. items are (filename, file_entry,
+    offset, length) tuples; the result is aligned with items. Ranges are
+    grouped per object, adjacent ranges are merged, each object is read with
+    a multi-range request, and different objects are fetched in parallel.
+    Records already in the record cache are not fetched again.
+    """
+    records: List[Optional[Dict[str, Any]]] = [None] * len(items)
+    by_path: Dict[str, List[int]] = {}
+    for idx, (filename, file_entry, offset, length) in enumerate(items):
+        path = record_file_path(run_id, filename, file_entry)
+        records[idx] = _RECORD_CACHE.get((run_id, path, offset, length))
+        if records[idx] is None:
+            by_path.setdefault(path, []).append(idx)
+    if not by_path:
+        return records
+
+    def _load(path: str) -> Dict[int, bytes]:
+        spans = _merge_ranges([(items[idx][2], items[idx][3]) for idx in by_path[path]])
+        fetched: Dict[int, bytes] = {}
+        for batch_start in range(0, len(spans), MAX_RANGES_PER_REQUEST):
+            fetched.update(_fetch_spans(path, spans[batch_start:batch_start + MAX_RANGES_PER_REQUEST]))
+        return fetched
+
+    paths = list(by_path)
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_PARALLEL_FETCHES, len(paths)))) as pool:
+        span_bytes = dict(zip(paths, pool.map(_load, paths)))
+
+    for path, indices in by_path.items():
+        for idx in indices:
+            filename, _, offset, length = items[idx]
+            span_start = max(start for start in span_bytes[path] if start <= offset)
+            raw = span_bytes[path][span_start][offset - span_start:offset - span_start + length]
+            text = raw.decode("utf-8").rstrip("\n")
+            if not text:
+                raise ValueError(f"No data returned for {filename} [{offset}, {length}]")
+            records[idx] = json.loads(text)
+            _RECORD_CACHE.set((run_id, path, offset, length), records[idx])
+    return records
 
 
 def _decode_hash_lookup(run_id: str, filename: str, file_entry: Dict[str, Any]) -> bytes:
     cache_key = (run_id, filename)
-    if cache_key in _LOOKUP_CACHE:
-        return _LOOKUP_CACHE[cache_key]
+    cached = _LOOKUP_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
 
     lookup = (file_entry or {}).get("hash_lookup") or {}
     data_b64 = lookup.get("data")
@@ -187,7 +358,7 @@ def _decode_hash_lookup(run_id: str, filename: str, file_entry: Dict[str, Any])
             f"hash_lookup size mismatch for {filename}: expected {expected_entries * 8} bytes, got {len(buffer)}"
         )
 
-    _LOOKUP_CACHE[cache_key] = buffer
+    _LOOKUP_CACHE.set(cache_key, buffer)
     return buffer
 
 
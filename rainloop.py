@@ -3,11 +3,17 @@ from web.ui.header import render_header
 from web.ui.sidebar import render_sidebar
 from web.ui.banner import render_banner
 from web.ui.styles import inject_styles
+from web.ui.fragments import fragment
 from web.content.warnings import render_warnings
 from web.content.current_weather import render_weather
 from web.content.nowcasting import render_nowcasting
 from web.content.radar import render_radar
 from chatbot.bot import run_chatbot
+from backend.radar_data import start_run_watcher
+
+# Seconds between reruns of the run-bound sections, which pick up a newly
+# published nowcast run
+RUN_CHECK_INTERVAL = 15
 
 # Page config
 st.set_page_config(
@@ -27,30 +33,46 @@ render_banner()
 render_header()
 
 # Layout
-col1, col2 = st.columns([1, 2])
-
-with col1:
+# Each section reruns on its own. Data dependencies:
+#   nowcasting -> published run
+#   location   -> published run, marker_location
+#   radar      -> published run, marker_location, selection_mode, map_zoom
+#                 (reruns only itself for mode and zoom changes; a marker
+#                 change reruns the page, whose map document is cached)
+#   chatbot    -> published run (read when a question is asked), its own chat state
+# Sections drawn from the published run rerun every RUN_CHECK_INTERVAL and
+# pick up a new run from the shared cache, which the watcher below fills
+@fragment(run_every=RUN_CHECK_INTERVAL)
+def _nowcasting_fragment():
     render_nowcasting()
+
+@fragment(run_every=RUN_CHECK_INTERVAL)
+def _location_fragment():
     render_warnings()
     render_weather()
-    
-with col2:
+
+@fragment(run_every=RUN_CHECK_INTERVAL)
+def _radar_fragment():
     render_radar()
 
-# Sidebar
-render_sidebar()
+col1, col2 = st.columns([1, 2])
 
-# Chatbot (isolated to avoid rerunning the entire layout on interactions)
-if hasattr(st, "fragment"):
-    @st.fragment
-    def _chatbot_fragment():
-        run_chatbot()
+# The radar runs first so a cold run load streams its first lead into the
+# map; the left column then reads the same frames from the shared cache
+with col2:
+    _radar_fragment()
+
+with col1:
+    _nowcasting_fragment()
+    _location_fragment()
 
-    _chatbot_fragment()
-elif hasattr(st, "experimental_fragment"):
-    _chatbot_fragment = st.experimental_fragment(run_chatbot)
-    _chatbot_fragment()
-else:
-    run_chatbot()
+# Sidebar
+render_sidebar()
 
+# New-run watcher: one background poller per server process prefetches runs
+# into the shared cache, so the run-bound sections above switch to a new
+# run on their next interval without downloading it themselves.
+start_run_watcher()
 
+# Chatbot (isolated to avoid rerunning the entire layout on interactions)
+fragment(run_chatbot)()
@@ -1,10 +1,17 @@
 import streamlit as st
-from backend.radar_data import generate_radar_data
+from backend.radar_data import latest_run_id, served_radar_data
 
 def render_nowcasting():
     st.markdown("### 📊 RAINLOOP Nowcasting Data")
 
-    processed_data = generate_radar_data()
+    # Only shown on a cold load; frames stream in lead order
+    progress = st.empty()
+
+    def _on_frame(label, loaded, total, _frame):
+        progress.progress(loaded / total, text=f"Loading nowcast frames… {label} ready ({loaded}/{total})")
+
+    run_id, processed_data = served_radar_data(on_frame=_on_frame)
+    progress.empty()
 
     if processed_data:
         if not st.session_state.get("nowcasting_data_loaded"):
@@ -12,11 +19,12 @@ def render_nowcasting():
         else:
             st.caption("✅ RAINLOOP backend data ready.")
         st.session_state["nowcasting_data_loaded"] = True
-        st.session_state.prediction_data = processed_data
+        st.session_state.prediction_run_id = run_id
     else:
         st.error("❌ Could not load RAINLOOP backend data")
         st.session_state["nowcasting_data_loaded"] = False
 
     if st.button("🔄 Refresh Data", use_container_width=True):
-            st.cache_data.clear()
+            # Re-check the run pointer only; cached runs and weather stay warm
+            latest_run_id(force_refresh=True)
             st.rerun()
\ No newline at end of file
@@ -1,64 +1,212 @@
+import json
+import time
 import numpy as np
 import streamlit as st
 import folium
-from streamlit_folium import folium_static, st_folium
+from streamlit_folium import st_folium
+from streamlit.components.v1 import html as components_html
 from backend.radar_data import generate_radar_data
 from folium.plugins import HeatMapWithTime, HeatMap
-from folium import Map, Marker
+from folium import Figure, Map, Marker
+from web.ui.fragments import rerun_app, rerun_fragment
+
+# Zoom at which the full-resolution grid is used; each zoom step out halves it
+FULL_RES_ZOOM = 9
+# Seconds after a zoom-driven resolution change during which further zoom
+# reports are ignored (the rebuilt map reports its zoom again on mount)
+ZOOM_DEBOUNCE = 2.0
+MOBILE_MARKERS = ("Mobi", "Android", "iPhone", "iPad")
+MAP_HEIGHT = 600
+
+# Heatmap gradient based on reflectivity value
+GRADIENT = {
+    0.00: 'rgba(0,0,0,0)', # transparent (no rain)
+    0.05: '#001040', # very light drizzle – dark navy
+    0.10: '#0020A0', # light rain – blue
+    0.20: '#0040FF', # light-moderate rain – bright blue
+    0.30: '#00A0FF', # moderate rain – cyan
+    0.40: '#00FFC0', # moderate-heavy rain – aqua green
+    0.50: '#00FF00', # heavy rain – green
+    0.60: '#A0FF00', # very heavy rain – lime
+    0.70: '#FFFF00', # intense rain – yellow
+    0.80: '#FFA000', # extreme rain – orange
+    0.90: '#FF4040', # torrential – red-orange
+    1.00: '#FF0000' # max reflectivity – bright red
+}
 
 def process_radar_data(prediction_data):
     # Extract coordinate arrays
     coords = prediction_data["coordinates"]
 
-    # Convert to NumPy arrays
-    lat_grid = np.array(coords["lat"])
-    lon_grid = np.array(coords["lon"])
-    reflectivity = np.array(prediction_data["reflectivity"])
+    # View as NumPy arrays (no copy when already decoded)
+    lat_grid = np.asarray(coords["lat"])
+    lon_grid = np.asarray(coords["lon"])
+    reflectivity = np.asarray(prediction_data["reflectivity"])
     return lat_grid, lon_grid, reflectivity
 
+def build_heat_data(lat_grid, lon_grid, values, stride=1):
+    """Return [[lat, lon, value], ...] for non-zero cells, optionally downsampled."""
+    lat = np.asarray(lat_grid)[::stride, ::stride].ravel()
+    lon = np.asarray(lon_grid)[::stride, ::stride].ravel()
+    val = np.asarray(values)[::stride, ::stride].ravel()
+    points = np.column_stack((lat, lon, val))
+    return points[val > 0].tolist()
+
+def frame_run_id(prediction_frame):
+    """Run identifier of a frame; older frames fall back to their valid time."""
+    metadata = prediction_frame.get("metadata", {})
+    return metadata.get("run_id") or metadata.get("valid_datetime")
+
+def is_coarse_session():
+    """Mobile browsers and sessions that opted into low-bandwidth maps get the coarsest level."""
+    if st.session_state.get("low_bandwidth"):
+        return True
+    context = getattr(st, "context", None)
+    headers = getattr(context, "headers", None) or {}
+    user_agent = headers.get("User-Agent", "") or ""
+    return any(marker in user_agent for marker in MOBILE_MARKERS)
+
+def pick_resolution(available_sizes, zoom=None, coarse=False):
+    """
+    Pyramid level (grid size) for the viewport: the coarsest level for
+    coarse sessions, full resolution until the user has zoomed, then one
+    level down per zoom step out from FULL_RES_ZOOM.
+    """
+    sizes = sorted(available_sizes, reverse=True)
+    if coarse:
+        return sizes[-1]
+    if zoom is None:
+        return sizes[0]
+    steps_out = max(0, FULL_RES_ZOOM - int(zoom))
+    return sizes[min(steps_out, len(sizes) - 1)]
+
+def remember_map_view(map_display):
+    """
+    Store the selection map's zoom as reported by st_folium. A change is
+    applied at most once per ZOOM_DEBOUNCE seconds, so the report from a
+    map rebuilt at a new resolution cannot flip it back.
+    """
+    zoom = (map_display or {}).get("zoom")
+    if zoom is None or zoom == st.session_state.get("map_zoom"):
+        return
+    now = time.monotonic()
+    if now - st.session_state.get("map_zoom_changed_at", 0.0) >= ZOOM_DEBOUNCE:
+        st.session_state.map_zoom = zoom
+        st.session_state.map_zoom_changed_at = now
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def heat_layer_points(run_id, lead, mode, resolution, _prediction_frame):
+    """
+    Heatmap points for one lead at one pyramid level, shared across reruns
+    and sessions. Only (run_id, lead, mode, resolution) is hashed; the frame
+    itself is not.
+    """
+    level = _prediction_frame["levels"][resolution]
+    return build_heat_data(level["lat"], level["lon"], level["reflectivity"])
+
+def _build_map(center, bounds, zoom=None):
+    # Build Folium map with fixed center and bounds, or at a known view
+    map = Map(
+        location=center,
+        tiles="Cartodb Positron",
+        max_bounds=True,
+        **({"zoom_start": zoom} if zoom is not None else {})
+    )
+    if zoom is None:
+        map.fit_bounds(bounds)
+    return map
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def map_document(run_id, mode, resolution, _prediction_data, _frames, _center, _bounds):
+    """
+    Rendered HTML of the marker-free map for one (run_id, mode, resolution),
+    shared across reruns and sessions. Returns (html, map_js_name) so
+    per-user overlays can be injected without re-rendering.
+    """
+    map = _build_map(_center, _bounds)
+    heat_data_seq = []
+    for n in _frames:
+        frame = _prediction_data[f"+{n}min"]
+        heat_data_seq.append(heat_layer_points(run_id, n, mode, resolution, frame))
+
+    # Add animated HeatMapWithTime
+    HeatMapWithTime(
+        heat_data_seq,
+        index=[f"Predicted Reflectivity — +{n} min" for n in _frames],
+        auto_play=True,
+        min_opacity=0,
+        use_local_extrema=True,
+        gradient=GRADIENT
+    ).add_to(map)
+
+    figure = Figure().add_child(map)
+    return figure.render(), map.get_name()
+
+def with_marker_overlay(document, map_name, location):
+    """Inject a marker into a cached map document as a small script overlay."""
+    lat, lon = float(location[0]), float(location[1])
+    popup = json.dumps(f"Selected: {list(location)}")
+    overlay = f"<script>L.marker([{lat}, {lon}]).bindPopup({popup}).addTo({map_name});</script>"
+    head, sep, tail = document.rpartition("</html>")
+    return f"{head}{overlay}{sep}{tail}" if sep else document + overlay
+
+def _init_viewport(prediction_frame):
+    """Map center and bounds from a frame's grid, once per session."""
+    if "map_center" in st.session_state and "map_bounds" in st.session_state:
+        return
+    lat_grid_0, lon_grid_0, _ = process_radar_data(prediction_frame)
+    st.session_state.map_center = [np.mean(lat_grid_0), np.mean(lon_grid_0)]
+    min_lat, max_lat = np.min(lat_grid_0), np.max(lat_grid_0)
+    min_lon, max_lon = np.min(lon_grid_0), np.max(lon_grid_0)
+    st.session_state.map_bounds = [[min_lat, min_lon], [max_lat, max_lon]]
+
+def render_frame_preview(prediction_frame, label):
+    """Static map of one lead, shown while the rest of a cold run downloads."""
+    _init_viewport(prediction_frame)
+    resolution = pick_resolution(
+        prediction_frame["levels"],
+        zoom=st.session_state.get("map_zoom"),
+        coarse=is_coarse_session(),
+    )
+    map = _build_map(st.session_state.map_center, st.session_state.map_bounds)
+    HeatMap(
+        heat_layer_points(frame_run_id(prediction_frame), label, "preview", resolution, prediction_frame),
+        min_opacity=0,
+        gradient=GRADIENT,
+    ).add_to(map)
+    components_html(Figure().add_child(map).render(), height=MAP_HEIGHT + 10)
+
 def render_radar():
-    # Use full-browser width
-    st.set_page_config(layout="wide")
     st.markdown("### 🎯 Weather Radar - Real-Time Precipitation")
-    
-    # Heatmap gradient based on reflectivity value
-    GRADIENT = {
-        0.00: 'rgba(0,0,0,0)', # transparent (no rain)
-        0.05: '#001040', # very light drizzle – dark navy
-        0.10: '#0020A0', # light rain – blue
-        0.20: '#0040FF', # light-moderate rain – bright blue
-        0.30: '#00A0FF', # moderate rain – cyan
-        0.40: '#00FFC0', # moderate-heavy rain – aqua green
-        0.50: '#00FF00', # heavy rain – green
-        0.60: '#A0FF00', # very heavy rain – lime
-        0.70: '#FFFF00', # intense rain – yellow
-        0.80: '#FFA000', # extreme rain – orange
-        0.90: '#FF4040', # torrential – red-orange
-        1.00: '#FF0000' # max reflectivity – bright red
-    }
-    
-    # Set up frames
-    frames = list(range(5, 125, 5))
-    
-    # Initialize session state
-    if "prediction_data" not in st.session_state or not st.session_state.prediction_data:
-        st.session_state.prediction_data = generate_radar_data()
 
+    # On a cold load the first lead is drawn as soon as it arrives; the
+    # animation replaces it once every lead is in
+    preview = st.empty()
+    loading = st.empty()
 
-    if "map_center" not in st.session_state or "map_bounds" not in st.session_state:
-        # Get initial latitude and longitude grids
-        lat_grid_0, lon_grid_0, _ = process_radar_data(st.session_state.prediction_data[f"+{frames[0]}min"])
-        
-        # Set map center
-        st.session_state.map_center = [np.mean(lat_grid_0), np.mean(lon_grid_0)]
-        
-        # Also set map bounds
-        min_lat, max_lat = np.min(lat_grid_0), np.max(lat_grid_0)
-        min_lon, max_lon = np.min(lon_grid_0), np.max(lon_grid_0)
-        st.session_state.map_bounds = [[min_lat, min_lon], [max_lat, max_lon]]
+    def _on_frame(label, loaded, total, frame):
+        if loaded == 1:
+            with preview.container():
+                render_frame_preview(frame, label)
+        loading.caption(f"Loading nowcast frames… {label} ready ({loaded}/{total})")
+
+    # Shared, read-only frames of the latest run
+    prediction_data = generate_radar_data(on_frame=_on_frame)
+    loading.empty()
+    preview.empty()
+
+    # Leads present in this run; the loader only serves complete runs, but
+    # never index a lead that is not there
+    frames = [n for n in range(5, 125, 5) if f"+{n}min" in prediction_data]
+    if not frames:
+        st.warning("Radar frames are not available yet.")
+        return
+
+    _init_viewport(prediction_data[f"+{frames[0]}min"])
 
     if "marker_location" not in st.session_state:
-        st.session_state.marker_location = (41.151920318603516, -104.8060302734375)  # Default radar origin location
+        # Only a pin the user placed; "near me" questions must not answer for the radar origin
+        st.session_state.marker_location = None
 
     if "selection_mode" not in st.session_state:
         st.session_state.selection_mode = False  # False = animated view, True = selection view
@@ -70,41 +218,43 @@ def render_radar():
         if st.session_state.marker_location:
             if st.button("🗑️ Clear Marker"):
                 st.session_state.marker_location = None
-                st.rerun()
+                # Warnings and weather read the marker; the animation comes
+                # from the cached map document, so a page rerun is cheap
+                rerun_app()
     # Button to toggle selection mode
     with col2:
         if not st.session_state.selection_mode:
             if st.button("📍 Select Location", use_container_width=True):
                 st.session_state.selection_mode = True
-                st.rerun()
+                rerun_fragment()
         else:
             if st.button("◀️ View Animation", use_container_width=True):
                 st.session_state.selection_mode = False
-                st.rerun()
+                rerun_fragment()
         
-    # Build Folium map with fixed center and bounds
-    map = Map(
-        location=st.session_state.map_center,
-        tiles="Cartodb Positron",
-        max_bounds=True
+    # Pyramid level for this viewport/device
+    resolution = pick_resolution(
+        prediction_data[f"+{frames[0]}min"]["levels"],
+        zoom=st.session_state.get("map_zoom"),
+        coarse=is_coarse_session(),
     )
-    map.fit_bounds(st.session_state.map_bounds)
     
     # SELECTION MODE - Interactive map with static heatmap
     if st.session_state.selection_mode:
         st.info("👆 Click on the map to place a marker")
-        
-        # Get the latest frame data
-        lat_grid_latest, lon_grid_latest, rainfall_latest = process_radar_data(st.session_state.prediction_data[f"+{frames[-1]}min"])
+        # Rebuild at the user's zoom (not fit_bounds) so the zoom it reports
+        # back matches the level it was built for
+        map = _build_map(
+            st.session_state.map_center,
+            st.session_state.map_bounds,
+            zoom=st.session_state.get("map_zoom"),
+        )
         
         # Build static heatmap data for latest frame
-        heat_data_latest = []
-        for i in range(lat_grid_latest.shape[0]):
-            for j in range(lon_grid_latest.shape[1]):
-                lat = lat_grid_latest[i, j]
-                lon = lon_grid_latest[i, j]
-                rain = rainfall_latest[i, j]
-                heat_data_latest.append([lat, lon, rain])
+        latest_frame = prediction_data[f"+{frames[-1]}min"]
+        heat_data_latest = heat_layer_points(
+            frame_run_id(latest_frame), frames[-1], "selection", resolution, latest_frame
+        )
         
         # Add static HeatMap with latest frame
         HeatMap(
@@ -124,10 +274,13 @@ def render_radar():
         map_display = st_folium(
             map,
             width=None,
-            height=600,
+            height=MAP_HEIGHT,
             key="selection_map",
-            returned_objects=["last_clicked"]
+            returned_objects=["last_clicked", "zoom"]
         )
+
+        # Remember the viewport zoom so both map modes pick a matching level
+        remember_map_view(map_display)
         
         # Capture click and update marker location
         if map_display and map_display.get("last_clicked"):
@@ -139,48 +292,31 @@ def render_radar():
             # Only update if location actually changed
             if st.session_state.marker_location != new_location:
                 st.session_state.marker_location = new_location
-                st.rerun()
+                # Warnings and weather read the marker, so rerun the page
+                rerun_app()
         
         # Display current selection
         if st.session_state.marker_location:
             st.success(f"✓ Marker placed at: [{st.session_state.marker_location[0]:.4f}, {st.session_state.marker_location[1]:.4f}]")
     
-    # ANIMATION MODE - Animated heatmap with folium_static
+    # ANIMATION MODE - Animated heatmap from the cached map document
     else:
-        # Prepare HeatMapWithTime data
-        heat_data_seq = []
-        for n in frames:
-            lat_grid_frame, lon_grid_frame, rainfall_frame = process_radar_data(st.session_state.prediction_data[f"+{n}min"])
-            
-            # Build HeatMap for this frame
-            heat_data = []
-            for i in range(lat_grid_frame.shape[0]):
-                for j in range(lon_grid_frame.shape[1]):
-                    lat = lat_grid_frame[i, j]
-                    lon = lon_grid_frame[i, j]
-                    rain = rainfall_frame[i, j]
-                    heat_data.append([lat, lon, rain])
-            heat_data_seq.append(heat_data)
-        
-        # Add animated HeatMapWithTime
-        HeatMapWithTime(
-            heat_data_seq,
-            index=[f"Predicted Reflectivity — +{n} min" for n in frames],
-            auto_play=True,
-            min_opacity=0,
-            use_local_extrema=True,
-            gradient=GRADIENT
-        ).add_to(map)
+        document, map_name = map_document(
+            frame_run_id(prediction_data[f"+{frames[0]}min"]),
+            "animation",
+            resolution,
+            prediction_data,
+            frames,
+            st.session_state.map_center,
+            st.session_state.map_bounds,
+        )
         
         # Add marker if location exists
         if st.session_state.marker_location:
-            Marker(
-                location=st.session_state.marker_location,
-                popup=f"Selected: {st.session_state.marker_location}"
-            ).add_to(map)
+            document = with_marker_overlay(document, map_name, st.session_state.marker_location)
         
         # Display animated map
-        folium_static(map, width=None, height=600)
+        components_html(document, height=MAP_HEIGHT + 10)
         
         # Show marker info if exists
         if st.session_state.marker_location:
@@ -1,6 +1,6 @@
 import streamlit as st
 import numpy as np
-from backend.radar_data import generate_radar_data
+from backend.radar_data import point_series
 
 def rain_category(dbz: float) -> str:
     """Categorize reflectivity (dBZ)."""
@@ -16,16 +16,6 @@ def rain_category(dbz: float) -> str:
         return "Light rain"
     return "Very light rain"
 
-def get_reflectivity_at(lat, lon, prediction_frame):
-    """Return reflectivity at nearest grid point to given lat/lon."""
-    lat_grid = np.array(prediction_frame["coordinates"]["lat"])
-    lon_grid = np.array(prediction_frame["coordinates"]["lon"])
-    refl_grid = np.array(prediction_frame["reflectivity"])
-
-    dist = (lat_grid - lat)**2 + (lon_grid - lon)**2
-    idx = np.unravel_index(np.argmin(dist), dist.shape)
-    return refl_grid[idx]
-
 def get_advisory(category: str) -> str:
     """Return precautionary measures based on rain category."""
     if category == "Extremely heavy rain":
@@ -67,17 +57,14 @@ def render_warnings():
     else:
         lat, lon = st.session_state.marker_location
 
-    # --- Load radar prediction data ---
-    if "prediction_data" not in st.session_state or not st.session_state.prediction_data:
-        st.session_state.prediction_data = generate_radar_data()
-
-    # --- Get reflectivity at marker location ---
-    total = 0
-    for radar_data in st.session_state.prediction_data.values():
-        total += get_reflectivity_at(lat, lon, radar_data)
+    # --- Reflectivity time series at marker location (cached per run) ---
+    _, series = point_series(lat, lon)
+    if series.size == 0:
+        st.info("Radar frames are not available yet.")
+        return
 
     # --- Compute average change over last 2 hours ---
-    last_2_hours = total/len(st.session_state.prediction_data)
+    last_2_hours = float(series.mean())
 
     # --- Categorize rainfall ---
     if last_2_hours > 0:
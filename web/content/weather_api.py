@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Cache lifetimes per upstream (seconds)
+GEOCODE_TTL = 24 * 60 * 60   # place names practically never change
+WEATHER_TTL = 5 * 60         # matches the panel's auto-update interval
+FAILURE_TTL = 30             # a failed fetch is not retried for this long
+COORD_DECIMALS = 3           # ~100 m; nearby clicks share one entry
+REQUEST_TIMEOUT = 5          # seconds, applied to every upstream call
+MAX_ENTRIES = 1024
+# Nominatim usage policy: at most one request per second per client
+GEOCODE_MIN_INTERVAL = 1.0
+
+NOMINATIM_HEADERS = {"User-Agent": "RainLoop-Nowcast/1.0 (contact: support@rainloop.ai)"}
+
+_CACHE: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+_IN_FLIGHT: Dict[Tuple, threading.Event] = {}
+_FAILURES: Dict[Tuple, Tuple[float, Exception]] = {}  # key -> (failed_at, error)
+_LOCK = threading.Lock()
+_SESSION: Dict[str, Optional[requests.Session]] = {"value": None}
+_GEOCODE_SLOT = {"next": 0.0}  # monotonic time the next geocode request may start
+_GEOCODE_LOCK = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Keep-alive HTTP session shared by every Streamlit session in the process."""
+    if _SESSION["value"] is None:
+        with _LOCK:
+            if _SESSION["value"] is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _SESSION["value"] = session
+    return _SESSION["value"]
+
+
+def _round_coords(lat: float, lon: float) -> Tuple[float, float]:
+    return round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS)
+
+
+def _wait_for_geocode_slot(max_wait: float = REQUEST_TIMEOUT) -> None:
+    """
+    Space reverse-geocode requests GEOCODE_MIN_INTERVAL apart across every
+    session in the process. Raises when the queue is longer than max_wait,
+    so a burst of new places degrades to "no name yet" instead of piling up.
+    """
+    with _GEOCODE_LOCK:
+        now = time.monotonic()
+        start = max(now, _GEOCODE_SLOT["next"])
+        if start - now > max_wait:
+            raise RuntimeError("Reverse geocoding is rate limited; try again shortly")
+        _GEOCODE_SLOT["next"] = start + GEOCODE_MIN_INTERVAL
+    if start > now:
+        time.sleep(start - now)
+
+
+def _cached_fetch(key: Tuple, ttl: float, fetch: Callable[[], Any], force: bool = False) -> Tuple[Any, float]:
+    """
+    Return (value, fetched_at_epoch) for key, calling fetch() at most once
+    per TTL. Concurrent callers for the same key wait for the in-flight
+    request instead of issuing their own. A failure is re-raised without
+    calling upstream again for FAILURE_TTL seconds, unless force is set.
+    """
+    while True:
+        with _LOCK:
+            entry = _CACHE.get(key)
+            if entry is not None and not force and time.time() - entry[0] < ttl:
+                _CACHE.move_to_end(key)
+                return entry[1], entry[0]
+            failure = _FAILURES.get(key)
+            if failure is not None and not force and time.time() - failure[0] < FAILURE_TTL:
+                raise failure[1]
+            event = _IN_FLIGHT.get(key)
+            if event is None:
+                event = threading.Event()
+                _IN_FLIGHT[key] = event
+                break
+        # Another session is fetching this key; reuse its result, or take
+        # over on the next pass if it failed
+        event.wait(REQUEST_TIMEOUT * 2)
+        force = False
+
+    try:
+        value = fetch()
+    except Exception as exc:
+        with _LOCK:
+            _FAILURES[key] = (time.time(), exc)
+            while len(_FAILURES) > MAX_ENTRIES:
+                _FAILURES.pop(next(iter(_FAILURES)))
+        raise
+    finally:
+        with _LOCK:
+            _IN_FLIGHT.pop(key, None)
+        event.set()
+
+    fetched_at = time.time()
+    with _LOCK:
+        _FAILURES.pop(key, None)
+        _CACHE[key] = (fetched_at, value)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > MAX_ENTRIES:
+            _CACHE.popitem(last=False)
+    return value, fetched_at
+
+
+def reverse_geocode(lat: float, lon: float, url: Optional[str] = None, force: bool = False) -> Optional[str]:
+    """Display name for a point via the Nominatim reverse API, or None on failure."""
+    url = url or os.getenv("NOMATIM_URL")
+    r_lat, r_lon = _round_coords(lat, lon)
+
+    def _fetch():
+        _wait_for_geocode_slot()
+        response = get_session().get(
+            url,
+            params={"lat": r_lat, "lon": r_lon, "format": "json", "zoom": 14, "addressdetails": 1},
+            headers=NOMINATIM_HEADERS,
+            timeout=REQUEST_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json().get("display_name")
+
+    try:
+        name, _ = _cached_fetch(("geocode", url, r_lat, r_lon), GEOCODE_TTL, _fetch, force=force)
+    except Exception:
+        return None
+    return name
+
+
+def current_weather(
+    lat: float,
+    lon: float,
+    url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    force: bool = False,
+) -> Tuple[Dict[str, Any], datetime]:
+    """
+    Current conditions from the OpenWeather API and the UTC time they were
+    fetched. Raises on transport errors or a non-200 payload.
+    """
+    url = url or os.getenv("WEATHER_URL")
+    api_key = api_key or os.getenv("MAP_API_KEY")
+    r_lat, r_lon = _round_coords(lat, lon)
+
+    def _fetch():
+        response = get_session().get(
+            url,
+            params={"lat": r_lat, "lon": r_lon, "units": "metric", "appid": api_key},
+            timeout=REQUEST_TIMEOUT,
+        )
+        data = response.json()
+        if data.get("cod") != 200:
+            raise RuntimeError(data.get("message") or f"HTTP {response.status_code}")
+        return data
+
+    data, fetched_at = _cached_fetch(("weather", url, r_lat, r_lon), WEATHER_TTL, _fetch, force=force)
+    return data, datetime.fromtimestamp(fetched_at, tz=timezone.utc)
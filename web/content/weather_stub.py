@@ -0,0 +1,129 @@
+# web/content/weather_stub.py
+"""
+Local stand-in for the OpenWeather and Nominatim endpoints used by
+web.content.weather_api, plus a check of the client against it.
+
+    python -m web.content.weather_stub            # run the client checks
+    python -m web.content.weather_stub --serve    # serve until Ctrl+C
+
+With --serve, point the app at it with WEATHER_URL=http://127.0.0.1:<port>/weather
+and NOMATIM_URL=http://127.0.0.1:<port>/reverse. /fail/weather answers like
+OpenWeather with a bad key.
+"""
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from web.content import weather_api
+
+# Seconds each stub response is delayed, so concurrent callers overlap
+RESPONSE_DELAY = 0.2
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Upstream requests per path, shared by every handler thread
+    hits: Dict[str, int] = {}
+    hits_lock = threading.Lock()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        with self.hits_lock:
+            self.hits[parsed.path] = self.hits.get(parsed.path, 0) + 1
+        threading.Event().wait(RESPONSE_DELAY)
+
+        if parsed.path == "/weather":
+            status, body = 200, {
+                "cod": 200,
+                "name": "Stubville",
+                "coord": {"lat": float(params.get("lat", 0)), "lon": float(params.get("lon", 0))},
+                "main": {"temp": 21.5, "feels_like": 21.0, "humidity": 80, "pressure": 1008},
+                "weather": [{"main": "Rain", "description": "light rain", "icon": "10d"}],
+                "wind": {"speed": 3.2},
+            }
+        elif parsed.path == "/fail/weather":
+            status, body = 401, {"cod": 401, "message": "Invalid API key (stub)"}
+        elif parsed.path == "/reverse":
+            status, body = 200, {"display_name": f"Stub Place near {params.get('lat')}, {params.get('lon')}"}
+        else:
+            status, body = 404, {"cod": 404, "message": "not found"}
+
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub(port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve the stub on a background thread; returns (server, base URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _expect(label: str, ok: bool) -> bool:
+    print(f"{'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+
+def run_checks(base_url: str) -> bool:
+    """Exercise weather_api's caching, coalescing and failure caching against the stub."""
+    hits = StubHandler.hits
+    weather_url, fail_url, reverse_url = f"{base_url}/weather", f"{base_url}/fail/weather", f"{base_url}/reverse"
+    results = []
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: weather_api.current_weather(41.14, -104.82, url=weather_url, api_key="stub"), range(8)))
+    results.append(_expect("8 concurrent sessions share one upstream request", hits.get("/weather") == 1))
+
+    data, _ = weather_api.current_weather(41.1401, -104.8201, url=weather_url, api_key="stub")
+    results.append(_expect("nearby point served from the cache", hits.get("/weather") == 1 and data["name"] == "Stubville"))
+
+    weather_api.current_weather(41.14, -104.82, url=weather_url, api_key="stub", force=True)
+    results.append(_expect("force refetches", hits.get("/weather") == 2))
+
+    for _ in range(3):
+        try:
+            weather_api.current_weather(41.14, -104.82, url=fail_url, api_key="bad")
+        except RuntimeError:
+            pass
+    results.append(_expect("a failure is not retried within FAILURE_TTL", hits.get("/fail/weather") == 1))
+
+    names = {weather_api.reverse_geocode(41.14, -104.82, url=reverse_url) for _ in range(3)}
+    results.append(_expect("reverse geocode cached", hits.get("/reverse") == 1 and len(names) == 1 and None not in names))
+    return all(results)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--serve", action="store_true", help="serve the stub instead of running the checks")
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    server, base_url = start_stub(args.port)
+    if args.serve:
+        print(f"stub serving at {base_url} (/weather, /fail/weather, /reverse)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+        server.shutdown()
+        return
+    try:
+        ok = run_checks(base_url)
+    finally:
+        server.shutdown()
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
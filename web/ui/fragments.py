@@ -0,0 +1,35 @@
+import streamlit as st
+from streamlit.errors import StreamlitAPIException
+
+
+def fragment(func=None, *, run_every=None):
+    """
+    Decorate a render function as an independently rerunning fragment.
+    Falls back to st.experimental_fragment, or a plain call on Streamlit
+    releases without fragments.
+    """
+    def wrap(f):
+        if hasattr(st, "fragment"):
+            return st.fragment(f, run_every=run_every)
+        if hasattr(st, "experimental_fragment"):
+            return st.experimental_fragment(f, run_every=run_every)
+        return f
+
+    return wrap(func) if func is not None else wrap
+
+
+def rerun_fragment():
+    """Rerun only the calling fragment (state that no other section reads)."""
+    try:
+        st.rerun(scope="fragment")
+    except (TypeError, StreamlitAPIException):
+        # Older Streamlit, or called outside a fragment
+        st.rerun()
+
+
+def rerun_app():
+    """Rerun every section (state that other fragments depend on changed)."""
+    try:
+        st.rerun(scope="app")
+    except (TypeError, StreamlitAPIException):
+        st.rerun()
@@ -9,4 +9,11 @@ def render_sidebar():
         st.markdown("- **Satellite:** Himawari-8/9")
         st.markdown("- **Models:** GFS, ECMWF, JMA")
 
+        st.markdown("#### Display")
+        st.toggle(
+            "Low-bandwidth map",
+            key="low_bandwidth",
+            help="Render the radar at the coarsest resolution to cut data transfer.",
+        )
+
         